@@ -0,0 +1,392 @@
+"""
+A local stand-in for the bits of Slack that lack talks to: the web API methods it calls and the RTM websocket. The
+server runs on its own event loop in a background thread so it can be scripted from ordinary code, e.g.
+
+    slack = FakeSlack(users=50, history=500)
+    slack.start()
+    LocalSlackClient.base_url = slack.base_url
+    LackManager.slack_client_class = LocalSlackClient
+    ...
+    slack.post("hello")
+    slack.disconnect()
+
+Only what lack needs is implemented: form-encoded POSTs to /api/<method>, and a websocket at /rtm that pushes
+events and ignores whatever the client sends besides close frames. The watched channel comes after all the others
+when conversations are listed, so a lookup by name has to page through them.
+"""
+import asyncio
+import base64
+import hashlib
+import json
+import random
+import select
+import struct
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Set
+from urllib.parse import parse_qsl
+
+import requests
+from slackclient import SlackClient
+from slackclient._slackrequest import SlackRequest
+from websocket import WebSocketConnectionClosedException
+
+WEBSOCKET_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+STATUS_TEXT = {
+    101: 'Switching Protocols',
+    200: 'OK',
+    404: 'Not Found',
+}
+
+
+class FakeSlack:
+    def __init__(self,
+                 channel: str = 'kiosk',
+                 users: int = 50,
+                 channels: int = 20,
+                 history: int = 100,
+                 private: bool = False,
+                 host: str = '127.0.0.1',
+                 port: int = 0,
+                 seed: int = 1) -> None:
+
+        self.host = host
+        self.port = port
+        self.calls: Counter = Counter()
+        self.posted: List[Dict[str, str]] = []
+        self.marks: List[Dict[str, str]] = []
+
+        self._rng = random.Random(seed)
+        self._last_ts = 0.0
+        self._ts_lock = threading.Lock()
+        self._loop = asyncio.new_event_loop()
+        self._thread: Optional[threading.Thread] = None
+        self._server: Any = None
+        self._websockets: Set[asyncio.StreamWriter] = set()
+
+        self.users = [{'id': f'U{i:08d}', 'name': f'user{i}'} for i in range(users)]
+        self.channel = {
+            'id': ('G' if private else 'C') + 'KIOSK0001',
+            'name': channel,
+            'topic': {'value': f'Welcome to #{channel}'},
+        }
+
+        # other channels so lookups have something to wade through
+        self.channels = [{'id': f'C{i:08d}', 'name': f'channel{i}', 'topic': {'value': ''}} for i in range(channels)]
+        self.groups: List[dict] = []
+        (self.groups if private else self.channels).append(self.channel)
+
+        self.history = [self.message(f'history message {i}') for i in range(history)]
+
+    # Scripting, all of these are safe to call from any thread
+
+    def start(self) -> None:
+        ready = threading.Event()
+
+        def run() -> None:
+            asyncio.set_event_loop(self._loop)
+            self._server = self._loop.run_until_complete(
+                asyncio.start_server(self._handle, self.host, self.port))
+            self.port = self._server.sockets[0].getsockname()[1]
+            ready.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+        ready.wait()
+
+    def stop(self) -> None:
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+        if self._thread is not None:
+            self._thread.join()
+
+    @property
+    def base_url(self) -> str:
+        return f'http://{self.host}:{self.port}'
+
+    @property
+    def connections(self) -> int:
+        return len(self._websockets)
+
+    def next_ts(self) -> str:
+        with self._ts_lock:
+            ts = max(time.time(), self._last_ts + 0.000001)
+            self._last_ts = ts
+
+        return f'{ts:.6f}'
+
+    def message(self, text: str, user: Optional[str] = None, **extra: Any) -> dict:
+        return {
+            'type': 'message',
+            'channel': self.channel['id'],
+            'user': user or self._rng.choice(self.users)['id'],
+            'text': text,
+            'ts': self.next_ts(),
+            **extra,
+        }
+
+    def post(self, text: str, user: Optional[str] = None, **extra: Any) -> str:
+        """
+        A message from someone else shows up in the channel. Returns its ts.
+        """
+
+        evt = self.message(text, user, **extra)
+        self.history.append(evt)
+        self.send_event(evt)
+        return evt['ts']
+
+    def send_event(self, evt: dict) -> None:
+        self._loop.call_soon_threadsafe(self._broadcast, evt)
+
+    def disconnect(self) -> None:
+        """
+        Drop every RTM connection, as Slack does every so often.
+        """
+
+        self._loop.call_soon_threadsafe(self._disconnect)
+
+    # Web API
+
+    def _api(self, method: str, params: Dict[str, str]) -> dict:
+        self.calls[method] += 1
+        handler = getattr(self, '_api_' + method.replace('.', '_'), None)
+
+        if handler is None:
+            return {'ok': False, 'error': 'unknown_method'}
+
+        return handler(params)
+
+    def _api_rtm_start(self, params: Dict[str, str]) -> dict:
+        return {
+            'ok': True,
+            'url': f'ws://{self.host}:{self.port}/rtm',
+            'self': {'id': 'U99999999', 'name': 'lack'},
+            'team': {'domain': 'fake'},
+            'users': [],
+            'channels': [],
+            'groups': [],
+            'ims': [],
+        }
+
+    def _api_users_list(self, params: Dict[str, str]) -> dict:
+        return {'ok': True, 'members': self.users}
+
+    def _api_conversations_list(self, params: Dict[str, str]) -> dict:
+        conversations = self.channels + self.groups
+        start = int(params.get('cursor') or 0)
+        end = start + int(params.get('limit', 100))
+        next_cursor = str(end) if end < len(conversations) else ''
+
+        return {'ok': True, 'channels': conversations[start:end], 'response_metadata': {'next_cursor': next_cursor}}
+
+    def _api_conversations_info(self, params: Dict[str, str]) -> dict:
+        for channel in self.channels + self.groups:
+            if channel['id'] == params.get('channel'):
+                return {'ok': True, 'channel': channel}
+
+        return {'ok': False, 'error': 'channel_not_found'}
+
+    def _api_conversations_mark(self, params: Dict[str, str]) -> dict:
+        self.marks.append(params)
+        return {'ok': True}
+
+    def _history(self, params: Dict[str, str]) -> dict:
+        count = int(params.get('count', 100))
+        messages = [m for m in self.history if m['channel'] == params.get('channel')]
+        replies = Counter(m['thread_ts'] for m in messages if m.get('thread_ts', m['ts']) != m['ts'])
+
+        # like Slack, thread replies stay out of the history and their parents only carry a count
+        messages = [{**m, 'reply_count': replies[m['ts']]} if replies[m['ts']] else m
+                    for m in messages if m.get('thread_ts', m['ts']) == m['ts']]
+
+        return {'ok': True, 'messages': messages[::-1][:count], 'has_more': len(messages) > count}
+
+    _api_conversations_history = _history
+
+    def _api_conversations_replies(self, params: Dict[str, str]) -> dict:
+        thread = [m for m in self.history
+                  if m['channel'] == params.get('channel') and m.get('thread_ts', m['ts']) == params.get('ts')]
+
+        if not thread:
+            return {'ok': False, 'error': 'thread_not_found'}
+
+        # the parent comes first on every page
+        start = int(params.get('cursor') or 0)
+        end = start + int(params.get('limit', 1000))
+        next_cursor = str(end) if end < len(thread) - 1 else ''
+
+        return {'ok': True,
+                'messages': thread[:1] + thread[1:][start:end],
+                'response_metadata': {'next_cursor': next_cursor}}
+
+    def _api_chat_postMessage(self, params: Dict[str, str]) -> dict:
+        self.posted.append(params)
+
+        evt = {
+            'type': 'message',
+            'channel': params['channel'],
+            'username': params.get('username', 'bot'),
+            'text': params['text'],
+            'ts': self.next_ts(),
+        }
+        self.history.append(evt)
+        self._broadcast(evt)
+
+        return {'ok': True, 'channel': params['channel'], 'ts': evt['ts']}
+
+    # HTTP and websocket plumbing, only ever run on the server thread
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request_line = (await reader.readline()).decode('latin-1')
+            headers = {}
+
+            while True:
+                line = (await reader.readline()).decode('latin-1').strip()
+                if not line:
+                    break
+                key, _, value = line.partition(':')
+                headers[key.strip().lower()] = value.strip()
+
+            verb, path, _ = request_line.split(' ', 2)
+
+            if headers.get('upgrade', '').lower() == 'websocket' and path.startswith('/rtm'):
+                await self._websocket(reader, writer, headers['sec-websocket-key'])
+                return
+
+            body = await reader.readexactly(int(headers.get('content-length', 0)))
+
+            if path.startswith('/api/'):
+                params = dict(parse_qsl(body.decode()))
+                self._respond(writer, 200, json.dumps(self._api(path[len('/api/'):], params)).encode())
+            else:
+                self._respond(writer, 404, b'{"ok":false}')
+
+            await writer.drain()
+
+        except (ConnectionError, ValueError, asyncio.IncompleteReadError):
+            pass
+
+        writer.close()
+
+    @staticmethod
+    def _respond(writer: asyncio.StreamWriter, status: int, body: bytes) -> None:
+        writer.write(f'HTTP/1.1 {status} {STATUS_TEXT[status]}\r\n'
+                     f'Content-Type: application/json\r\n'
+                     f'Content-Length: {len(body)}\r\n'
+                     f'Connection: close\r\n\r\n'.encode() + body)
+
+    async def _websocket(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, key: str) -> None:
+        accept = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode()).digest()).decode()
+
+        writer.write(f'HTTP/1.1 101 {STATUS_TEXT[101]}\r\n'
+                     f'Upgrade: websocket\r\n'
+                     f'Connection: Upgrade\r\n'
+                     f'Sec-WebSocket-Accept: {accept}\r\n\r\n'.encode())
+
+        self._websockets.add(writer)
+        self._send_frame(writer, json.dumps({'type': 'hello'}).encode())
+
+        try:
+            while True:
+                opcode = await self._read_frame(reader)
+
+                if opcode == 0x8:
+                    break
+
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+
+        self._websockets.discard(writer)
+        writer.close()
+
+    @staticmethod
+    async def _read_frame(reader: asyncio.StreamReader) -> int:
+        head, length = await reader.readexactly(2)
+        masked = length & 0x80
+        length &= 0x7f
+
+        if length == 126:
+            length, = struct.unpack('!H', await reader.readexactly(2))
+        elif length == 127:
+            length, = struct.unpack('!Q', await reader.readexactly(8))
+
+        await reader.readexactly(length + (4 if masked else 0))
+        return head & 0x0f
+
+    @staticmethod
+    def _send_frame(writer: asyncio.StreamWriter, payload: bytes, opcode: int = 0x1) -> None:
+        length = len(payload)
+
+        if length < 126:
+            header = struct.pack('!BB', 0x80 | opcode, length)
+        elif length < 1 << 16:
+            header = struct.pack('!BBH', 0x80 | opcode, 126, length)
+        else:
+            header = struct.pack('!BBQ', 0x80 | opcode, 127, length)
+
+        writer.write(header + payload)
+
+    def _broadcast(self, evt: dict) -> None:
+        payload = json.dumps(evt).encode()
+
+        for writer in list(self._websockets):
+            self._send_frame(writer, payload)
+
+    def _disconnect(self) -> None:
+        for writer in list(self._websockets):
+            self._send_frame(writer, b'', opcode=0x8)
+            writer.close()
+
+        self._websockets.clear()
+
+
+class LocalSlackRequest(SlackRequest):
+    """
+    Sends web API calls to a FakeSlack instead of https://slack.com.
+    """
+
+    def __init__(self, base_url: str) -> None:
+        super(LocalSlackRequest, self).__init__()
+        self.base_url = base_url
+
+    def do(self, token, request="?", post_data=None, domain=None, timeout=None):
+        post_data = {k: v if isinstance(v, str) else json.dumps(v) for k, v in (post_data or {}).items()}
+        post_data['token'] = token
+
+        return requests.post(f'{self.base_url}/api/{request}', data=post_data, timeout=timeout)
+
+
+class LocalSlackClient(SlackClient):
+    """
+    A SlackClient wired to a FakeSlack. Set base_url before lack creates one, and point
+    LackManager.slack_client_class at this class.
+    """
+
+    base_url: str = ''
+
+    def __init__(self, token: str) -> None:
+        super(LocalSlackClient, self).__init__(token)
+        self.server.api_requester = LocalSlackRequest(self.base_url)
+
+    def rtm_read(self):
+        # slackclient only expects the non-blocking socket to run dry under SSL. On a plain socket, wait until data is
+        # there and then read the whole frame blocking so it can't be cut in half.
+        sock = self.server.websocket.sock
+
+        if sock is None:
+            raise WebSocketConnectionClosedException()
+
+        if not select.select([sock], [], [], 0)[0]:
+            return []
+
+        sock.setblocking(True)
+
+        try:
+            return super(LocalSlackClient, self).rtm_read()
+        finally:
+            if sock.fileno() != -1:
+                sock.setblocking(False)
@@ -0,0 +1,275 @@
+"""
+End to end load test. Runs the full curses client in a pseudo-terminal against a FakeSlack, pushes messages at it
+following a traffic profile, and reports post-to-paint latency, CPU and memory for each profile.
+
+    python -m benchmarks.latency [profile ...]
+
+Every message carries the monotonic time it was posted at. The client is patched to note which of them end up on
+screen in each frame, and the frame counts as painted once getch() has refreshed the screen. Memory is the peak RSS
+of the client and its formatting workers together.
+"""
+import atexit
+import fcntl
+import json
+import os
+import pty
+import random
+import re
+import signal
+import struct
+import sys
+import tempfile
+import termios
+import threading
+import time
+from typing import Dict, List, NamedTuple
+
+from .fakeslack import FakeSlack, LocalSlackClient
+
+TAG_RE = re.compile(r'load (\d+) t=(\d+\.\d+)')
+
+ROWS, COLS = 40, 120
+
+FILLER = ("the quick brown fox jumps over the lazy dog while the kiosk keeps scrolling along with every message "
+          "that comes in from the channel").split()
+
+
+class Profile(NamedTuple):
+    rate: float  # messages per second
+    duration: float  # seconds
+    disconnect_every: float = 0.0  # seconds between dropped RTM connections, 0 for never
+    words: int = 12  # average message length
+
+
+PROFILES: Dict[str, Profile] = {
+    'idle': Profile(rate=1, duration=10),
+    'steady': Profile(rate=10, duration=20),
+    'busy': Profile(rate=50, duration=20),
+    'long-messages': Profile(rate=10, duration=20, words=120),
+    'reconnect-storm': Profile(rate=20, duration=20, disconnect_every=2),
+}
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return float('nan')
+
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def run_client(results_path: str, base_url: str) -> None:
+    """
+    The child side: the real lack client with a little instrumentation, talking to the fake server.
+    """
+
+    from lack import lackmanager, logsubwindow, main as lack_main, window
+
+    LocalSlackClient.base_url = base_url
+    lackmanager.LackManager.slack_client_class = LocalSlackClient
+
+    latencies: Dict[int, float] = {}
+    frame: Dict[int, float] = {}
+
+    set_spans = logsubwindow.LogSubWindow.set_spans
+    textbox_prompt = window.PromptSubWindow.textbox_prompt
+
+    def traced_set_spans(self, y, x, spans, *args, **kwargs):
+        match = TAG_RE.search(''.join(text for _, text in spans))
+
+        if match:
+            frame[int(match.group(1))] = float(match.group(2))
+
+        return set_spans(self, y, x, spans, *args, **kwargs)
+
+    def traced_textbox_prompt(self, *args, **kwargs):
+        result = textbox_prompt(self, *args, **kwargs)
+        now = time.monotonic()
+
+        for seq, sent in frame.items():
+            latencies.setdefault(seq, now - sent)
+
+        frame.clear()
+        return result
+
+    def dump() -> None:
+        with open(results_path, 'w') as f:
+            json.dump({'latencies': latencies}, f)
+
+    logsubwindow.LogSubWindow.set_spans = traced_set_spans
+    window.PromptSubWindow.textbox_prompt = traced_textbox_prompt
+    atexit.register(dump)
+
+    lack_main.main()
+
+
+def _rss_kib(pid: int) -> int:
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+
+    return 0
+
+
+def _tree_rss_kib(pid: int) -> int:
+    """
+    RSS of pid and everything under it, so the formatting pool's workers are counted with the client.
+    """
+
+    children: Dict[int, List[int]] = {}
+
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # the command name can contain spaces and parentheses, the fields after it can't
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+
+        children.setdefault(ppid, []).append(int(entry))
+
+    total = 0
+    pending = [pid]
+
+    while pending:
+        current = pending.pop()
+        total += _rss_kib(current)
+        pending.extend(children.get(current, ()))
+
+    return total
+
+
+def run_profile(name: str, profile: Profile) -> dict:
+    slack = FakeSlack(history=200)
+    slack.start()
+    rng = random.Random(name)
+
+    # Results and the channel and read marker caches live here, so runs don't touch ~/.cache/lack or each other
+    workdir = tempfile.TemporaryDirectory(prefix='lack-latency-')
+    results_path = os.path.join(workdir.name, 'results.json')
+
+    pid, master = pty.fork()
+
+    if pid == 0:
+        os.environ.update({
+            'SLACK_API_TOKEN': 'xoxb-fake',
+            'SLACK_CHANNEL': slack.channel['name'],
+            'SLACK_CACHE_DIR': workdir.name,
+            'TERM': os.environ.get('TERM', 'xterm-256color'),
+        })
+        os.environ.pop('SLACK_SOCKET', None)
+        os.execvp(sys.executable, [sys.executable, '-m', 'benchmarks.latency', '--client', results_path, slack.base_url])
+
+    fcntl.ioctl(master, termios.TIOCSWINSZ, struct.pack('HHHH', ROWS, COLS, 0, 0))
+
+    # Keep the terminal drained so curses never blocks on output
+    def drain() -> None:
+        try:
+            while os.read(master, 65536):
+                pass
+        except OSError:
+            pass
+
+    threading.Thread(target=drain, daemon=True).start()
+
+    rss_samples: List[int] = []
+    sampling = threading.Event()
+
+    def sample() -> None:
+        while not sampling.wait(0.2):
+            rss_samples.append(_tree_rss_kib(pid))
+
+    threading.Thread(target=sample, daemon=True).start()
+
+    # Wait for the client to connect and load its history
+    deadline = time.monotonic() + 30
+    while not (slack.connections and slack.calls['conversations.history']) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    time.sleep(1)
+
+    sent = 0
+    start = time.monotonic()
+    next_disconnect = start + profile.disconnect_every if profile.disconnect_every else float('inf')
+    disconnects = 0
+
+    while True:
+        now = time.monotonic()
+        elapsed = now - start
+
+        if elapsed >= profile.duration:
+            break
+
+        if now >= next_disconnect:
+            slack.disconnect()
+            disconnects += 1
+            next_disconnect += profile.disconnect_every
+
+        due = int(elapsed * profile.rate) + 1
+        while sent < due:
+            words = max(1, int(rng.expovariate(1 / profile.words)))
+            text = " ".join(rng.choice(FILLER) for _ in range(words))
+            slack.post(f"load {sent} t={time.monotonic():.6f} {text}")
+            sent += 1
+
+        time.sleep(min(0.005, 1 / profile.rate))
+
+    # Give the client a moment to catch up, then stop it
+    time.sleep(2)
+    os.kill(pid, signal.SIGINT)
+    _, status, usage = os.wait4(pid, 0)
+    sampling.set()
+    slack.stop()
+    os.close(master)
+
+    try:
+        with open(results_path) as f:
+            latencies = list(json.load(f)['latencies'].values())
+    except (OSError, ValueError):
+        latencies = []
+
+    workdir.cleanup()
+
+    wall = time.monotonic() - start
+    cpu = usage.ru_utime + usage.ru_stime
+
+    return {
+        'profile': name,
+        'sent': sent,
+        'painted': len(latencies),
+        'disconnects': disconnects,
+        'p50': percentile(latencies, 50) * 1000,
+        'p90': percentile(latencies, 90) * 1000,
+        'p99': percentile(latencies, 99) * 1000,
+        'max': max(latencies, default=float('nan')) * 1000,
+        'cpu': cpu / wall * 100,
+        'rss': max(rss_samples, default=0) / 1024,
+        'api_calls': sum(slack.calls.values()),
+    }
+
+
+def main() -> None:
+    if sys.argv[1:2] == ['--client']:
+        run_client(sys.argv[2], sys.argv[3])
+        return
+
+    names = sys.argv[1:] or list(PROFILES)
+
+    print(f"{'profile':<16} {'sent':>6} {'painted':>7} {'discon':>6} "
+          f"{'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8} {'cpu %':>6} {'rss MiB':>8} {'api':>5}")
+
+    for name in names:
+        r = run_profile(name, PROFILES[name])
+        print(f"{r['profile']:<16} {r['sent']:>6} {r['painted']:>7} {r['disconnects']:>6} "
+              f"{r['p50']:>8.1f} {r['p90']:>8.1f} {r['p99']:>8.1f} {r['max']:>8.1f} "
+              f"{r['cpu']:>6.1f} {r['rss']:>8.1f} {r['api_calls']:>5}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Memory used by the message log: the LogStore layout against the SortedDict of pre-wrapped, prefixed lines lack used
+to keep.
+
+    python -m benchmarks.log_memory [messages] [width]
+"""
+import gc
+import random
+import sys
+import tracemalloc
+from textwrap import TextWrapper
+
+from sortedcontainers import SortedDict
+
+from lack.formatter import format_message
+from lack.logstore import LogStore
+
+WORDS = ("the quick brown fox jumps over lazy dog deploy build release ticket review merge coffee lunch "
+         "standup meeting kiosk client server token channel thread reply").split()
+AUTHORS = [f"user{i}" for i in range(40)]
+
+
+def generate(count: int, seed: int = 1):
+    rng = random.Random(seed)
+    messages = []
+    ts = 1500000000
+
+    for _ in range(count):
+        ts += rng.randint(1, 120)
+        length = rng.choice((3, 5, 8, 12, 20, 40, 80))
+        text = " ".join(rng.choice(WORDS) for _ in range(length))
+        messages.append((rng.randint(1, 14), f"{ts}.000100", rng.choice(AUTHORS), text))
+
+    return messages
+
+
+def build_sorteddict(messages, width: int) -> SortedDict:
+    """
+    The log as it used to be stored: one str(ts) key and (color, text) tuple per wrapped line, each with the
+    date/name prefix or its padding baked in.
+    """
+
+    loglines = SortedDict()
+
+    for color, ts, name, text in messages:
+        message = format_message(color, ts, name, text, {}, 'UTC', width)
+        prefix = message.prefix
+        wrapper = TextWrapper(subsequent_indent=" " * len(prefix), width=width)
+
+        for line in wrapper.wrap(f"{prefix}{text}"):
+            loglines[str(ts)] = (color, f"{line}")
+            ts = float(ts) + 0.000001
+
+    return loglines
+
+
+def build_logstore(messages, width: int) -> LogStore:
+    store = LogStore()
+
+    for color, ts, name, text in messages:
+        store.add(ts, format_message(color, ts, name, text, {}, 'UTC', width))
+
+    return store
+
+
+def measure(builder, messages, width: int):
+    gc.collect()
+    tracemalloc.start()
+    log = builder(messages, width)
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return log, size
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    width = int(sys.argv[2]) if len(sys.argv) > 2 else 80
+
+    messages = generate(count)
+
+    old, old_size = measure(build_sorteddict, messages, width)
+    new, new_size = measure(build_logstore, messages, width)
+
+    print(f"{count} messages at width {width}")
+    print(f"  SortedDict: {len(old):>8} lines {old_size / 2 ** 20:8.1f} MiB {old_size / len(old):6.0f} B/line")
+    print(f"  LogStore:   {len(new):>8} lines {new_size / 2 ** 20:8.1f} MiB {new_size / len(new):6.0f} B/line")
+    print(f"  {new_size / old_size:.0%} of the old size")
+
+
+if __name__ == '__main__':
+    main()
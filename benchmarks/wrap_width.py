@@ -0,0 +1,118 @@
+"""
+Speed of cell-width aware wrapping and truncation against the len() based versions they replaced, on plain ASCII and
+on mixed-script text (CJK, Hangul, accented Latin, emoji).
+
+    python -m benchmarks.wrap_width [messages] [width]
+
+The len() baseline is the same wrap_spans/truncate_spans code with the width functions swapped for len() and plain
+slicing, which is exactly what they were before. A third column keeps the ASCII fast path but looks every other
+character up with unicodedata instead of going through the table, for comparison. Times are the best of three runs,
+overflow counts the wrapped lines that would run past the border.
+"""
+import random
+import sys
+import time
+import unicodedata
+from contextlib import contextmanager
+
+from lack import markup
+from lack.cellwidth import text_width
+
+ASCII_WORDS = ("the quick brown fox jumps over lazy dog deploy build release ticket review merge coffee lunch "
+               "standup meeting kiosk client server token channel thread reply").split()
+
+MIXED_WORDS = ASCII_WORDS + ("日本語 テスト 漢字 中文消息 한국어 메시지 café naïve über Ελληνικά русский "
+                             "👍 🎉 👍🏽 🚀 ｆｕｌｌ").split()
+
+
+def generate(words, count: int, seed: int = 1):
+    rng = random.Random(seed)
+    return [[(markup.PLAIN, " ".join(rng.choice(words) for _ in range(rng.choice((3, 8, 20, 40, 80)))))]
+            for _ in range(count)]
+
+
+def _len_split(text: str, cells: int):
+    return text[:cells], text[cells:]
+
+
+def _unicodedata_width(text: str) -> int:
+    width = 0
+
+    for char in text:
+        if unicodedata.combining(char) or unicodedata.category(char) in ('Me', 'Cf', 'Cc'):
+            continue
+
+        width += 2 if unicodedata.east_asian_width(char) in ('W', 'F') else 1
+
+    return width
+
+
+def _unicodedata_split(text: str, cells: int):
+    width = 0
+
+    for i, char in enumerate(text):
+        width += _unicodedata_width(char)
+
+        if width > cells:
+            return text[:i], text[i:]
+
+    return text, ""
+
+
+@contextmanager
+def widths(width_func, split_func):
+    saved = markup.text_width, markup.split_at
+    markup.text_width, markup.split_at = width_func, split_func
+
+    try:
+        yield
+    finally:
+        markup.text_width, markup.split_at = saved
+
+
+def run(messages, width: int):
+    start = time.perf_counter()
+    lines = [line for spans in messages for line in markup.wrap_spans(spans, width)]
+    wrapped = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for line in lines:
+        markup.truncate_spans(line, width // 2)
+    truncated = time.perf_counter() - start
+
+    overflow = sum(1 for line in lines if sum(text_width(text) for _, text in line) > width)
+
+    return wrapped, truncated, overflow
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    width = int(sys.argv[2]) if len(sys.argv) > 2 else 80
+
+    variants = [
+        ('len()', len, _len_split),
+        ('table', markup.text_width, markup.split_at),
+        ('unicodedata', _unicodedata_width, _unicodedata_split),
+    ]
+
+    print(f"{count} messages at width {width}, wrap / truncate in ms, overflowing lines")
+    print(f"  {'':<6} " + "  |".join(f"{name:^21}" for name, _, _ in variants))
+
+    for name, words in (('ascii', ASCII_WORDS), ('mixed', MIXED_WORDS)):
+        messages = generate(words, count)
+        row = []
+
+        for _, width_func, split_func in variants:
+            with widths(width_func, split_func):
+                runs = [run(messages, width) for _ in range(3)]
+
+            wrapped = min(r[0] for r in runs)
+            truncated = min(r[1] for r in runs)
+            overflow = runs[0][2]
+            row.append(f"{wrapped * 1000:8.0f} {truncated * 1000:6.0f} {overflow:6}")
+
+        print(f"  {name:<6} " + "  |".join(row))
+
+
+if __name__ == '__main__':
+    main()
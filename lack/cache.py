@@ -0,0 +1,33 @@
+import json
+
+import os
+
+"""
+Small JSON files kept between runs, under $SLACK_CACHE_DIR (~/.cache/lack by default).
+"""
+
+
+def cache_path(name: str) -> str:
+    return os.path.join(os.getenv("SLACK_CACHE_DIR", os.path.expanduser("~/.cache/lack")), name)
+
+
+def load(path: str) -> dict:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save(path: str, data: dict) -> None:
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # write then rename so two kiosks starting at once can't leave a half written file
+        tmp_path = f"{path}.{os.getpid()}"
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    except OSError:
+        pass
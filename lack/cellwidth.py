@@ -0,0 +1,124 @@
+import re
+from bisect import bisect_right
+from typing import Tuple
+
+from .widthtable import STARTS, WIDTHS
+
+"""
+How many terminal cells text takes up. East Asian wide and fullwidth characters (CJK, most emoji) take two cells,
+combining marks and other zero width characters take none, and everything else takes one. Widths come from a run
+length table generated ahead of time (see _generate below), so every process uses the same widths whichever Unicode
+version its Python ships with.
+
+Printable ASCII, which is nearly all of it, is counted with len() without ever looking at the table.
+"""
+
+# Anything that isn't printable ASCII needs a lookup
+_SPECIAL_RE = re.compile(r'[^\x20-\x7e]')
+
+
+class _WidthCache(dict):
+    def __missing__(self, char: str) -> int:
+        width = self[char] = int(WIDTHS[bisect_right(STARTS, ord(char)) - 1])
+        return width
+
+
+_widths = _WidthCache()
+
+
+def is_narrow(text: str) -> bool:
+    """
+    True when text is all printable ASCII, i.e. its width is its length.
+    """
+
+    return _SPECIAL_RE.search(text) is None
+
+
+def text_width(text: str) -> int:
+    special = _SPECIAL_RE.findall(text)
+
+    if not special:
+        return len(text)
+
+    # every special character was counted as one by len()
+    return len(text) + sum(map(_widths.__getitem__, special)) - len(special)
+
+
+def split_at(text: str, cells: int) -> Tuple[str, str]:
+    """
+    Split text after as many characters as fit in cells. A wide character that would straddle the boundary goes to
+    the tail, zero width characters right after the boundary stay with the character they belong to.
+    """
+
+    if not _SPECIAL_RE.search(text):
+        return text[:cells], text[cells:]
+
+    # nothing is wider than two cells, so the first cells // 2 characters fit whatever they are
+    start = max(cells // 2, 0)
+    width = text_width(text[:start])
+
+    for i in range(start, len(text)):
+        width += _widths[text[i]]
+
+        if width > cells:
+            return text[:i], text[i:]
+
+    return text, ""
+
+
+def _generate() -> str:
+    """
+    The source of widthtable.py, from the unicodedata of the running Python.
+    """
+
+    import unicodedata
+
+    def width(code: int) -> int:
+        char = chr(code)
+        category = unicodedata.category(char)
+
+        if category in ('Mn', 'Me', 'Cc') or (category == 'Cf' and code != 0x00AD):
+            return 0
+
+        # Hangul medial vowels and final consonants join onto the syllable before them
+        if 0x1160 <= code <= 0x11FF or 0xD7B0 <= code <= 0xD7FF:
+            return 0
+
+        # unassigned code points are narrow, apart from those reserved for more CJK ideographs
+        if category == 'Cn':
+            reserved_wide = (0x3400 <= code <= 0x4DBF or 0x4E00 <= code <= 0x9FFF or 0xF900 <= code <= 0xFAFF
+                             or 0x20000 <= code <= 0x3FFFD)
+            return 2 if reserved_wide else 1
+
+        if unicodedata.east_asian_width(char) in ('W', 'F'):
+            return 2
+
+        return 1
+
+    starts = []
+    widths = []
+
+    for code in range(0x110000):
+        w = width(code)
+
+        if not widths or widths[-1] != w:
+            starts.append(code)
+            widths.append(w)
+
+    rows = [", ".join(f"0x{start:X}" for start in starts[i:i + 10]) for i in range(0, len(starts), 10)]
+    digits = "".join(map(str, widths))
+
+    return (f'"""\n'
+            f'Terminal cell widths from Unicode {unicodedata.unidata_version}. Generated by `python -m lack.cellwidth`, '
+            f'don\'t edit.\n\n'
+            f'Code points from STARTS[i] up to STARTS[i + 1] are int(WIDTHS[i]) cells wide.\n'
+            f'"""\n\n'
+            f'STARTS = (\n' + "".join(f"    {row},\n" for row in rows) + ')\n\n'
+            f'WIDTHS = (\n' + "".join(f"    '{digits[i:i + 100]}'\n" for i in range(0, len(digits), 100)) + ')\n')
+
+
+if __name__ == '__main__':
+    import os
+
+    with open(os.path.join(os.path.dirname(__file__), 'widthtable.py'), 'w') as f:
+        f.write(_generate())
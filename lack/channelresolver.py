@@ -0,0 +1,103 @@
+import re
+from typing import Callable, Dict, Optional, Tuple
+
+from . import cache
+
+"""
+Finds the channel lack should watch. A channel ID is used as is. A name is looked up in an index kept on disk between
+runs, and only when that misses are the workspace's conversations listed, one page at a time, until the name turns
+up. Every channel seen on the way is added to the index.
+"""
+
+CHANNEL_ID_RE = re.compile(r'^[CG][A-Z0-9]{8,}$')
+
+# Channels per page when walking conversations.list
+PAGE_SIZE = 200
+
+
+class LookupFailed(Exception):
+    """
+    The channel list couldn't be read to the end (rate limited, network trouble), so a name that wasn't found may
+    still exist. Worth trying again later, unlike a (None, "") result.
+    """
+
+
+class ChannelResolver:
+    def __init__(self, api_call: Callable[..., dict], index_path: str, workspace: str = '') -> None:
+        self._api_call = api_call
+        self.index_path = index_path
+        self.workspace = workspace or 'default'
+        self._index: Dict[str, Dict[str, str]] = cache.load(index_path)
+
+    @property
+    def names(self) -> Dict[str, str]:
+        return self._index.setdefault(self.workspace, {})
+
+    def resolve(self, channel: str) -> Tuple[Optional[str], str]:
+        """
+        Returns (channel id, topic), or (None, "") when there's no such channel. Raises LookupFailed when that can't
+        be told yet.
+        """
+
+        channel = channel.lstrip('#')
+
+        if CHANNEL_ID_RE.match(channel):
+            response = self._api_call("conversations.info", channel=channel)
+
+            if response.get('ok'):
+                return channel, _topic(response['channel'])
+
+            # anything other than a missing channel (rate limits and the like) says nothing about the ID itself
+            return (None, "") if response.get('error') == 'channel_not_found' else (channel, "")
+
+        channel_id = self.names.get(channel)
+
+        if channel_id is not None:
+            response = self._api_call("conversations.info", channel=channel_id)
+
+            if response.get('ok'):
+                # the ID is still good as long as it still has this name
+                if response['channel'].get('name') == channel:
+                    return channel_id, _topic(response['channel'])
+
+            elif response.get('error') != 'channel_not_found':
+                # couldn't check, trust the index rather than wade through every channel
+                return channel_id, ""
+
+            del self.names[channel]
+
+        return self._search(channel)
+
+    def _search(self, name: str) -> Tuple[Optional[str], str]:
+        cursor = ''
+        found: Tuple[Optional[str], str] = (None, "")
+
+        while True:
+            response = self._api_call("conversations.list",
+                                      types="public_channel,private_channel",
+                                      exclude_archived=1,
+                                      limit=PAGE_SIZE,
+                                      cursor=cursor)
+
+            if not response.get('ok'):
+                # keep what was learnt from the pages that did come back
+                cache.save(self.index_path, self._index)
+                raise LookupFailed(response.get('error', 'unknown error'))
+
+            for channel in response['channels']:
+                self.names[channel['name']] = channel['id']
+
+                if channel['name'] == name:
+                    found = channel['id'], _topic(channel)
+
+            cursor = response.get('response_metadata', {}).get('next_cursor', '')
+
+            if found[0] is not None or not cursor:
+                break
+
+        cache.save(self.index_path, self._index)
+        return found
+
+
+def _topic(channel: dict) -> str:
+    return channel.get('topic', {}).get('value', "")
@@ -0,0 +1,55 @@
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+import pytz
+
+from .logstore import LogMessage
+from .cellwidth import text_width
+from .markup import parse, wrap_spans
+
+"""
+Message formatting lives here as plain functions so that large batches (history pages, reflows) can be shipped off
+to a worker pool instead of blocking the event loop. Nothing in this module may touch LackManager state.
+"""
+
+def format_message(color: int,
+                   ts: str,
+                   name: str,
+                   text: str,
+                   members: Dict[str, str],
+                   tz_name: str,
+                   width: int) -> LogMessage:
+    """
+    Parse, timestamp and wrap a single message. The body is wrapped to fit alongside the header, which is left for
+    the log to draw.
+    """
+
+    spans = parse(text, members)
+
+    tz = pytz.timezone(tz_name)
+    posix_timestamp, _ = ts.split('.')
+    posix_timestamp = int(posix_timestamp)
+    utc_dt = datetime.fromtimestamp(posix_timestamp)
+    dt = utc_dt.astimezone(tz)
+    date = dt.strftime('%a %I:%M%p')
+
+    prefix_width = text_width(date) + text_width(name) + 3
+
+    return LogMessage.from_spans(date, name, color, wrap_spans(spans, width, prefix_width))
+
+
+def format_batch(messages: List[Tuple[int, str, str, str]],
+                 members: Dict[str, str],
+                 tz_name: str,
+                 width: int) -> List[Tuple[Tuple[int, str, str, str], LogMessage]]:
+    """
+    Format a chunk of (color, ts, name, text) messages. This is the unit of work handed to the worker pool, each
+    message is returned alongside its lines so the caller can tell whether it changed while the chunk was out.
+    """
+
+    formatted = []
+
+    for message in messages:
+        formatted.append((message, format_message(*message, members, tz_name, width)))
+
+    return formatted
@@ -0,0 +1,146 @@
+import asyncio
+import json
+import logging
+from concurrent.futures import Executor
+from typing import Optional
+
+import os
+
+from .lackmanager import LogManager
+
+"""
+The terminal side of daemon mode. LackClient looks like a LackManager to the window, but its log comes from a
+LackDaemon over a Unix socket instead of from Slack, and messages typed in are handed back to the daemon to post.
+"""
+
+# Snapshot pages and member lists can be well over asyncio's default 64k line limit
+READ_LIMIT = 64 * 1024 * 1024
+
+
+class LackClient(LogManager):
+    # A dozen clients on one host shouldn't each fork a worker per CPU. Snapshots are the only big batches they see.
+    format_workers = 1
+
+    def __init__(self, output_width, executor: Optional[Executor] = None):
+        super(LackClient, self).__init__(output_width, executor)
+
+        self.socket_path = os.environ["SLACK_SOCKET"]
+        self._writer: Optional[asyncio.StreamWriter] = None
+
+        asyncio.ensure_future(self._attach())
+
+    async def _attach(self):
+        try:
+            reader, self._writer = await asyncio.open_unix_connection(self.socket_path, limit=READ_LIMIT)
+
+        except OSError:
+            asyncio.ensure_future(self._reattach())
+            return
+
+        try:
+            while True:
+                line = await reader.readline()
+
+                if not line:
+                    break
+
+                self._apply(json.loads(line))
+
+        except (ConnectionError, ValueError):
+            pass
+
+        except Exception:
+            # Anything else is an update this client doesn't understand. Start over from a fresh snapshot rather than
+            # sit there frozen.
+            logging.getLogger(__name__).exception("Couldn't apply an update from the daemon")
+
+        self._writer.close()
+        self._writer = None
+        asyncio.ensure_future(self._reattach())
+
+    async def _reattach(self):
+        self._add_status(3, '----- Reconnecting -----')
+
+        await asyncio.sleep(5)
+        asyncio.ensure_future(self._attach())
+
+    def _apply(self, update: dict) -> None:
+        kind = update['type']
+
+        if kind == 'snapshot':
+            # Start over, anything still being formatted from a previous snapshot is thrown away
+            self._generation += 1
+            self._messages = {}
+            self._status = set(update['status'])
+            self.loglines.clear()
+            self._membernames = update['members']
+            self.channel_topic = update['topic']
+            self.last_read = update['last_read']
+            self.divider_ts = update['last_read'] or None
+            self._divider_count = 0
+            self._reactions = update['reactions']
+            self._reply_counts = update['reply_counts']
+            self._replies = {}
+            self._reply_parents = {}
+            self._reply_cache = {}
+
+            for parent, replies in update['replies'].items():
+                self._replies[parent] = {ts: (color, name, text) for color, ts, name, text in replies}
+                self._reply_parents.update((ts, parent) for ts in self._replies[parent])
+
+        elif kind == 'history':
+            messages = [tuple(m) for m in update['messages']]
+
+            for color, ts, name, text in messages:
+                self._messages[ts] = (color, name, text)
+
+            asyncio.ensure_future(self._format_batch(messages))
+
+        elif kind == 'add':
+            self._add_logline(*update['message'], status=update.get('status', False))
+
+        elif kind == 'remove':
+            self._remove_logline(update['ts'])
+
+        elif kind == 'reply':
+            self._add_reply(update['parent'], *update['message'])
+
+        elif kind == 'replies':
+            self._add_replies(update['parent'], [tuple(m) for m in update['messages']])
+
+        elif kind == 'reply_count':
+            self._set_reply_count(update['ts'], update['count'])
+
+        elif kind == 'reactions':
+            self._set_reactions(update['ts'], update['reactions'])
+
+        elif kind == 'read':
+            # Read on some other client, or coming back from our own mark
+            self.last_read = max(self.last_read, update['ts'])
+
+        elif kind == 'topic':
+            self._set_topic(update['topic'])
+
+        elif kind == 'members':
+            self._set_members(update['members'])
+
+    def _send_read_marker(self, ts: str) -> None:
+
+        if self._writer is None:
+            return
+
+        self._writer.write(json.dumps({'type': 'mark', 'ts': ts}).encode() + b'\n')
+
+    def fetch_replies(self, ts: str) -> None:
+
+        if self._writer is None:
+            return
+
+        self._writer.write(json.dumps({'type': 'replies', 'ts': ts}).encode() + b'\n')
+
+    async def send_message(self, msg):
+
+        if self._writer is None:
+            return
+
+        self._writer.write(json.dumps({'type': 'send', 'text': msg}).encode() + b'\n')
@@ -0,0 +1,132 @@
+import asyncio
+import json
+import signal
+import sys
+from typing import Any, Set
+
+import os
+
+from .lackmanager import LackManager, LogManager
+
+"""
+Daemon mode: one LackManager owns the Slack connection and the raw message log, and any number of LackClients
+attach to it over a Unix socket. The protocol is one JSON object per line. A client that attaches is sent a
+snapshot (topic, members, read marker, which lines are lack's own, then the log in pages) followed by every update
+the manager publishes. A client can send {"type": "send", "text": ...} to post a message, {"type": "mark", "ts": ...}
+to move the read marker, or {"type": "replies", "ts": ...} to have the replies in a thread fetched for everyone.
+"""
+
+# Pages of the log sent in a snapshot are this many messages long
+SNAPSHOT_PAGE_SIZE = 250
+
+
+def encode(update: dict) -> bytes:
+    return json.dumps(update, separators=(',', ':')).encode() + b'\n'
+
+
+class LackDaemon:
+    # A client with this much unsent data has stopped reading, it gets dropped and can reattach for a new snapshot
+    max_client_buffer: int = 4 * 1024 * 1024
+
+    def __init__(self, socket_path: str, manager: LogManager) -> None:
+        self.socket_path = socket_path
+        self.manager = manager
+        self._clients: Set[asyncio.StreamWriter] = set()
+        self._server: Any = None
+
+        self.manager.subscribe(self._broadcast)
+
+    async def start(self) -> None:
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+        self._server = await asyncio.start_unix_server(self._handle_client, path=self.socket_path)
+
+    def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+
+        for writer in self._clients:
+            writer.close()
+
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+    def _send_snapshot(self, writer: asyncio.StreamWriter) -> None:
+        messages = self.manager.messages()
+
+        writer.write(encode({
+            'type': 'snapshot',
+            'topic': self.manager.channel_topic,
+            'members': self.manager.members,
+            'last_read': self.manager.last_read,
+            'status': self.manager.status_lines(),
+            **self.manager.threads(),
+        }))
+
+        for i in range(0, len(messages), SNAPSHOT_PAGE_SIZE):
+            writer.write(encode({'type': 'history', 'messages': messages[i:i + SNAPSHOT_PAGE_SIZE]}))
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+
+        # No awaits between the snapshot and joining the client list, so no update can fall in between
+        self._send_snapshot(writer)
+        self._clients.add(writer)
+
+        try:
+            while True:
+                line = await reader.readline()
+
+                if not line:
+                    break
+
+                request = json.loads(line)
+
+                if request.get('type') == 'send':
+                    asyncio.ensure_future(self.manager.send_message(request['text']))
+
+                elif request.get('type') == 'mark':
+                    self.manager.mark_read(request['ts'])
+
+                elif request.get('type') == 'replies':
+                    # goes out to every client as a 'replies' update
+                    self.manager.fetch_replies(request['ts'])
+
+        except (ConnectionError, ValueError, KeyError):
+            pass
+
+        finally:
+            self._clients.discard(writer)
+            writer.close()
+
+    def _broadcast(self, update: dict) -> None:
+        if not self._clients:
+            return
+
+        data = encode(update)
+
+        for writer in list(self._clients):
+            if writer.transport.get_write_buffer_size() > self.max_client_buffer:
+                self._clients.discard(writer)
+                writer.close()
+                continue
+
+            writer.write(data)
+
+
+def main() -> None:
+    event_loop = asyncio.get_event_loop()
+
+    # The daemon only relays raw messages, each client formats them for its own window
+    manager = LackManager(None)
+    daemon = LackDaemon(os.environ["SLACK_SOCKET"], manager)
+
+    def exit_handler(*_: Any) -> None:
+        daemon.close()
+        sys.exit(0)
+
+    signal.signal(signal.SIGINT, exit_handler)
+    signal.signal(signal.SIGTERM, exit_handler)
+
+    event_loop.run_until_complete(daemon.start())
+    event_loop.run_forever()
@@ -1,44 +1,555 @@
 import asyncio
-import html
 import logging
+import signal
+import sys
+from abc import ABC, abstractmethod
+from concurrent.futures import Executor, ProcessPoolExecutor
 from datetime import datetime
-from textwrap import TextWrapper
+from typing import Callable, Dict, List, Optional, Set, Tuple
 
 import os
-import pytz
-import re
-import sys
 
 from slackclient import SlackClient
-from sortedcontainers import SortedDict
 from websocket import WebSocketConnectionClosedException
 
+from . import cache
+from .channelresolver import ChannelResolver, LookupFailed
+from .formatter import format_batch, format_message
+from .logstore import LogMessage, LogStore
+from .markup import BOLD, ITALIC, PLAIN, Line, wrap_spans
+
+
+def _init_worker() -> None:
+    # Workers are forked from the client and start out with its signal handlers. A Ctrl-C goes to the whole process
+    # group, and the client's handler would have every worker end curses on the shared terminal.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGWINCH, signal.SIG_DFL)
+
+
+def _format_pool(workers: Optional[int]) -> Executor:
+    # initializer is new in 3.7
+    if sys.version_info >= (3, 7):
+        return ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+
+    return ProcessPoolExecutor(max_workers=workers)
+
+
+class LogManager(ABC):
+    """
+    Owns the message log: raw messages as they arrive, and the formatted LogStore that gets drawn. Subclasses decide
+    where messages come from. With an output_width of None nothing is formatted, only the raw messages are kept and
+    published to subscribers.
+    """
 
-class LackManager:
-    # loglines = [(0, str(index)) for index, x in enumerate(range(100))]
-    loglines = SortedDict()
     channel_topic = ""
 
+    _membernames: dict = {}
+
+    # Batches (history, reflows) are formatted off the event loop in chunks of this many messages
+    format_chunk_size: int = 250
+    # Worker processes for that, None for one per CPU. SLACK_FORMAT_WORKERS overrides it.
+    format_workers: Optional[int] = None
+
+    # The read marker is sent once it has stopped moving for read_marker_delay seconds, and at least every
+    # read_marker_max_delay seconds while it keeps moving (a busy channel scrolling past)
+    read_marker_delay: float = 2.0
+    read_marker_max_delay: float = 30.0
+
+    def __init__(self, output_width: Optional[int], executor: Optional[Executor] = None):
+        self.output_width = output_width
+        self._tz = os.getenv('SLACK_TZ', 'UTC')
+        self.loglines = LogStore()
+
+        # Raw (color, name, text) for every message in the log, keyed by ts, so the log can be reformatted
+        self._messages: dict = {}
+        # ts of lack's own lines ("Connected" and so on), which aren't Slack messages and never count as read or unread
+        self._status: Set[str] = set()
+        self._generation = 0
+        self._batches = 0
+        self._pending: Optional[List[Tuple[int, str, str, str]]] = None
+        self._subscribers: List[Callable[[dict], None]] = []
+
+        # Threads and reactions, kept apart from the messages they hang off so they can change without a rewrap
+        self._expanded: Set[str] = set()
+        self._formatting_replies: Set[str] = set()
+        self._reactions: Dict[str, Dict[str, int]] = {}
+        self._replies: Dict[str, Dict[str, Tuple[int, str, str]]] = {}
+        self._reply_counts: Dict[str, int] = {}
+        self._reply_parents: Dict[str, str] = {}
+        self._reply_cache: Dict[str, LogMessage] = {}
+
+        # Everything up to last_read has been on screen. The "new messages" divider goes under divider_ts.
+        self.last_read = ""
+        self.divider_ts: Optional[str] = None
+        self._divider_count = 0
+        self._read_deadline = 0.0
+        self._read_flush: Optional[asyncio.Future] = None
+
+        if executor is None and output_width is not None:
+            workers = os.getenv("SLACK_FORMAT_WORKERS")
+            executor = _format_pool(int(workers) if workers else self.format_workers)
+
+        self._executor = executor
+
+    def subscribe(self, callback: Callable[[dict], None]) -> None:
+        """
+        Call callback with an update dict whenever the log, topic or member list changes.
+        """
+
+        self._subscribers.append(callback)
+
+    def _publish(self, update: dict) -> None:
+        for callback in self._subscribers:
+            callback(update)
+
+    @property
+    def members(self) -> dict:
+        return self._membernames
+
+    def threads(self) -> dict:
+        """
+        Everything known about threads and reactions, in the same shape the snapshot in daemon mode sends it.
+        """
+
+        return {
+            'reactions': self._reactions,
+            'reply_counts': self._reply_counts,
+            'replies': {parent: [(color, ts, name, text) for ts, (color, name, text) in sorted(replies.items())]
+                        for parent, replies in self._replies.items()},
+        }
+
+    def messages(self) -> List[Tuple[int, str, str, str]]:
+        """
+        Every raw message in the log as (color, ts, name, text), oldest first.
+        """
+
+        return [(color, ts, name, text) for ts, (color, name, text) in sorted(self._messages.items())]
+
+    def status_lines(self) -> List[str]:
+        return sorted(self._status)
+
+    def _set_topic(self, topic: str) -> None:
+        self.channel_topic = topic
+        self._publish({'type': 'topic', 'topic': topic})
+
+    def _set_members(self, members: dict) -> None:
+        self._membernames = members
+        self._publish({'type': 'members', 'members': members})
+
+    def _count_after(self, ts: str) -> int:
+        statuses = sum(1 for status in self._status if status > ts and status in self.loglines)
+        return self.loglines.count_after(ts) - statuses
+
+    def unread_count(self) -> int:
+        return self._count_after(self.last_read)
+
+    def last_message(self, ts: str) -> Optional[str]:
+        """
+        The newest Slack message at or before ts, skipping over lack's own lines.
+        """
+
+        for message_ts in self.loglines.before(ts):
+            if message_ts not in self._status:
+                return message_ts
+
+        return None
+
+    def mark_read(self, ts: str) -> None:
+        """
+        Move the read marker up to ts. Marks that come in quick succession, e.g. while scrolling, are coalesced into
+        a single _send_read_marker once they settle.
+        """
+
+        # While a batch is being merged its chunks land out of order, the bottom of the log isn't the newest yet
+        if ts <= self.last_read or ts in self._status or self._batches:
+            return
+
+        self._set_last_read(ts)
+        self._read_deadline = asyncio.get_event_loop().time() + self.read_marker_delay
+
+        if self._read_flush is None:
+            self._read_flush = asyncio.ensure_future(self._flush_read_marker())
+
+    def _set_last_read(self, ts: str) -> None:
+        self.last_read = ts
+        self._publish({'type': 'read', 'ts': ts})
+
+    async def _flush_read_marker(self) -> None:
+        loop = asyncio.get_event_loop()
+        latest = loop.time() + self.read_marker_max_delay
+
+        while loop.time() < min(self._read_deadline, latest):
+            await asyncio.sleep(min(self._read_deadline, latest) - loop.time())
+
+        self._read_flush = None
+        self._send_read_marker(self.last_read)
+
+    @abstractmethod
+    def _send_read_marker(self, ts: str) -> None:
+        """
+        Tell wherever the messages come from that everything up to ts has been read.
+        """
+
+    def set_divider(self, ts: Optional[str]) -> None:
+        """
+        Put the "new messages" divider under the message at ts, or take it away with None.
+        """
+
+        old, self.divider_ts = self.divider_ts, ts
+
+        if old is not None:
+            self._update_footer(old)
+
+        if ts is not None:
+            self._update_footer(ts)
+
+    def _refresh_divider(self) -> None:
+        # Only the count under the divider changes as messages come and go, the footer is left alone until it does
+        if self.divider_ts is not None and self._count_after(self.divider_ts) != self._divider_count:
+            self._update_footer(self.divider_ts)
+
+    def _add_status(self, color, text):
+        self._add_logline(color, str(datetime.now().timestamp()), '', text, status=True)
+
+    def _add_logline(self, color, ts, name, text, status=False):
+
+        self._messages[ts] = (color, name, text)
+
+        if status:
+            self._status.add(ts)
+
+        self._publish({'type': 'add', 'message': (color, ts, name, text), 'status': status})
+
+        if self.output_width is None:
+            return
+
+        if self._pending is not None:
+            self._pending.append((color, ts, name, text))
+            return
+
+        # Live messages take the cheap inline path so they show up immediately
+        message = format_message(color, ts, name, text, self._membernames, self._tz, self.output_width)
+        self.loglines.add(ts, message)
+        self._update_footer(ts)
+
+        if self.divider_ts is not None and ts > self.divider_ts:
+            self._refresh_divider()
+
+    def _remove_logline(self, ts):
+
+        parent = self._reply_parents.pop(ts, None)
+
+        if parent is not None:
+            self._replies[parent].pop(ts, None)
+            self._reply_cache.pop(ts, None)
+            self._update_footer(parent)
+
+        else:
+            self._messages.pop(ts, None)
+            self._status.discard(ts)
+            self._reactions.pop(ts, None)
+            self.loglines.remove(ts)
+
+            if self.divider_ts is not None and ts > self.divider_ts:
+                self._refresh_divider()
+
+        self._publish({'type': 'remove', 'ts': ts})
+
+    def _add_reply(self, parent, color, ts, name, text):
+
+        self._replies.setdefault(parent, {})[ts] = (color, name, text)
+        self._reply_parents[ts] = parent
+        self._reply_cache.pop(ts, None)
+        self._publish({'type': 'reply', 'parent': parent, 'message': (color, ts, name, text)})
+        self._update_footer(parent)
+
+    def _add_replies(self, parent: str, replies: List[Tuple[int, str, str, str]]) -> None:
+        """
+        A whole thread's worth of replies at once, with a single footer update so they're formatted as one batch.
+        """
+
+        thread = self._replies.setdefault(parent, {})
+
+        for color, ts, name, text in replies:
+            thread[ts] = (color, name, text)
+            self._reply_parents[ts] = parent
+            self._reply_cache.pop(ts, None)
+
+        self._publish({'type': 'replies', 'parent': parent, 'messages': replies})
+        self._update_footer(parent)
+
+    def _set_reply_count(self, ts, count):
+
+        self._reply_counts[ts] = count
+        self._publish({'type': 'reply_count', 'ts': ts, 'count': count})
+        self._update_footer(ts)
+
+    def _set_reactions(self, ts, reactions: Dict[str, int]):
+
+        self._reactions[ts] = reactions
+        self._publish({'type': 'reactions', 'ts': ts, 'reactions': reactions})
+        self._update_footer(ts)
+
+    def _react(self, ts, reaction, delta):
+
+        reactions = dict(self._reactions.get(ts, {}))
+        count = reactions.get(reaction, 0) + delta
+
+        if count > 0:
+            reactions[reaction] = count
+        else:
+            reactions.pop(reaction, None)
+
+        self._set_reactions(ts, reactions)
+
+    def has_thread(self, ts: str) -> bool:
+        return max(self._reply_counts.get(ts, 0), len(self._replies.get(ts, {}))) > 0
+
+    def toggle_thread(self, ts: str) -> None:
+        """
+        Expand or collapse the replies under one message.
+        """
+
+        if ts in self._expanded:
+            self._expanded.discard(ts)
+        else:
+            self._expanded.add(ts)
+
+            # History only carries the reply count, the replies themselves are fetched the first time they're wanted
+            if self._reply_counts.get(ts, 0) > len(self._replies.get(ts, {})):
+                self.fetch_replies(ts)
+
+        self._update_footer(ts)
+
+    def _update_footer(self, ts):
+        """
+        Rebuild the reactions, thread and divider lines under a message. The message body is left alone, only the footer
+        and replies in an expanded thread that haven't been formatted yet go through the formatter.
+        """
+
+        if self.output_width is None or ts not in self.loglines:
+            return
+
+        parent = self.loglines[ts]
+        width = self.output_width - parent.prefix_width
+        footer: List[Line] = []
+
+        reactions = self._reactions.get(ts)
+
+        if reactions:
+            text = "  ".join(f":{name}: {count}" for name, count in sorted(reactions.items()))
+            footer.extend(wrap_spans([(PLAIN, text)], width))
+
+        replies = self._replies.get(ts, {})
+        count = max(self._reply_counts.get(ts, 0), len(replies))
+
+        expanded = ts in self._expanded
+
+        if count:
+            marker = "[-]" if expanded else "[+]"
+            summary = f"{marker} {count} {'reply' if count == 1 else 'replies'}"
+
+            if replies:
+                summary += f", last from {replies[max(replies)][1]}"
+
+            footer.append(((ITALIC, summary),))
+
+        if expanded:
+            uncached = [reply_ts for reply_ts in replies if reply_ts not in self._reply_cache]
+
+            # A reply arriving live is formatted here like any other message, a whole thread opening goes to the pool.
+            # Until it's back only the replies already formatted are shown.
+            if len(uncached) == 1 and ts not in self._formatting_replies:
+                color, name, text = replies[uncached[0]]
+                self._reply_cache[uncached[0]] = format_message(color, uncached[0], name, text, self._membernames,
+                                                                self._tz, width - 2)
+
+            elif uncached and ts not in self._formatting_replies:
+                asyncio.ensure_future(self._format_replies(ts, width - 2))
+
+            for reply_ts in sorted(replies):
+                reply = self._reply_cache.get(reply_ts)
+
+                if reply is not None:
+                    footer.extend(((PLAIN, "  "),) + reply.line(i) for i in range(len(reply)))
+
+        if ts == self.divider_ts:
+            count = self._divider_count = self._count_after(ts)
+
+            if count:
+                footer.append(((BOLD, f"----- {count} new {'message' if count == 1 else 'messages'} -----"),))
+
+        self.loglines.set_footer(ts, tuple(footer))
+
+    async def _format_replies(self, ts: str, width: int) -> None:
+        """
+        Format the replies in a thread that was just expanded on the worker pool, then rebuild its footer.
+        """
+
+        pending = [(color, reply_ts, name, text)
+                   for reply_ts, (color, name, text) in sorted(self._replies.get(ts, {}).items())
+                   if reply_ts not in self._reply_cache]
+        generation = self._generation
+
+        self._formatting_replies.add(ts)
+
+        try:
+            try:
+                formatted = await asyncio.get_event_loop().run_in_executor(self._executor,
+                                                                           format_batch,
+                                                                           pending,
+                                                                           self._membernames,
+                                                                           self._tz,
+                                                                           width)
+            except Exception:
+                logging.getLogger(__name__).exception("Formatting replies on the worker pool failed, formatting inline")
+                formatted = self._format_inline(pending, width)
+
+            # After a reflow these are the wrong width, the footer update below asks for them again
+            if generation == self._generation:
+                replies = self._replies.get(ts, {})
+
+                for (color, reply_ts, name, text), reply in formatted:
+                    if replies.get(reply_ts) == (color, name, text):
+                        self._reply_cache[reply_ts] = reply
+
+        finally:
+            self._formatting_replies.discard(ts)
+
+        self._update_footer(ts)
+
+    async def _format_batch(self, messages: List[Tuple[int, str, str, str]]) -> None:
+        """
+        Format a large batch of messages on the worker pool. Chunks are merged into the log as they complete so the
+        event loop keeps handling input while the rest of the batch is still being formatted. If the pool fails, what's
+        left of the batch is formatted on the event loop instead.
+        """
+
+        if not messages or self.output_width is None:
+            return
+
+        loop = asyncio.get_event_loop()
+        members = self._membernames
+        size = self.format_chunk_size
+        generation = self._generation
+        futures = []
+
+        self._batches += 1
+
+        try:
+            remaining = {message[1] for message in messages}
+
+            try:
+                # submitting raises too once the pool is broken
+                futures = [loop.run_in_executor(self._executor,
+                                                format_batch,
+                                                messages[i:i + size],
+                                                members,
+                                                self._tz,
+                                                self.output_width)
+                           for i in range(0, len(messages), size)]
+
+                for future in asyncio.as_completed(futures):
+                    formatted = await future
+
+                    if generation != self._generation:
+                        return
+
+                    self._merge_formatted(formatted)
+                    remaining.difference_update(message[1] for message, _ in formatted)
+
+            except Exception:
+                # A worker died (BrokenProcessPool) or formatting raised. Whatever hasn't come back yet is formatted
+                # here instead, a chunk at a time so input is still handled in between.
+                logging.getLogger(__name__).exception("Formatting on the worker pool failed, formatting inline")
+
+                for future in futures:
+                    future.cancel()
+
+                left = [message for message in messages if message[1] in remaining]
+
+                for i in range(0, len(left), size):
+                    await asyncio.sleep(0)
+
+                    if generation != self._generation:
+                        return
+
+                    self._merge_formatted(self._format_inline(left[i:i + size], self.output_width))
+
+        finally:
+            self._batches -= 1
+
+    def _format_inline(self,
+                       messages: List[Tuple[int, str, str, str]],
+                       width: int) -> List[Tuple[Tuple[int, str, str, str], LogMessage]]:
+        formatted = []
+
+        for message in messages:
+            try:
+                formatted.append((message, format_message(*message, self._membernames, self._tz, width)))
+            except Exception:
+                logging.getLogger(__name__).exception("Couldn't format message %s", message[1])
+
+        return formatted
+
+    def _merge_formatted(self, formatted: List[Tuple[Tuple[int, str, str, str], LogMessage]]) -> None:
+
+        # Skip anything that was edited or deleted while its chunk was in flight
+        for (color, ts, name, text), message in formatted:
+            if self._messages.get(ts) == (color, name, text):
+                self.loglines.add(ts, message)
+                self._update_footer(ts)
+
+        self._refresh_divider()
+
+    def reflow(self, output_width: int) -> None:
+        """
+        Rewrap the whole log for a new width. The formatting happens on the worker pool.
+        """
+
+        self.output_width = output_width
+        self._generation += 1
+        self.loglines.clear()
+        self._reply_cache.clear()
+
+        asyncio.ensure_future(self._format_batch(self.messages()))
+
+    @abstractmethod
+    def fetch_replies(self, ts: str) -> None:
+        """
+        Load the replies in the thread under ts. They come back through _add_replies, now or later.
+        """
+
+    @abstractmethod
+    async def send_message(self, msg):
+        """
+        Post msg to the channel.
+        """
+
+
+class LackManager(LogManager):
+    # Swapped out to point lack at something other than slack.com, see benchmarks/fakeslack.py
+    slack_client_class = SlackClient
+
     _membercache: dict = {}
     _channelcache: dict = {}
     _connected: bool = False
     _channel_id: str  = None
 
-    def __init__(self, output_width):
+    def __init__(self, output_width, executor: Optional[Executor] = None):
+        super(LackManager, self).__init__(output_width, executor)
+
         slack_token = os.environ["SLACK_API_TOKEN"]
         self.username = os.getenv("SLACK_USERNAME", "Anonymous")
         self.channel_name = os.environ["SLACK_CHANNEL"]
         self._debug = bool(os.getenv("SLACK_DEBUG", False))
-        self.username_re = re.compile('(U[A-Z0-9]{8})')
-        self.output_width = output_width
 
         if self._debug:
             self.logger = logging.getLogger()
             self.logger.addHandler(logging.FileHandler('/tmp/lack_debug.log'))
             self.logger.setLevel(logging.DEBUG)
 
-        self._sc = SlackClient(slack_token)
-        self._tz = os.getenv('SLACK_TZ', 'UTC')
+        self._sc = self.slack_client_class(slack_token)
 
         self._connect()
         asyncio.ensure_future(self.update_messages())
@@ -47,23 +558,24 @@ class LackManager:
         if self._sc.rtm_connect():
             self._connected = True
             # print("Connected")
-            self.loglines = SortedDict()
+            self.loglines.clear()
+            self._messages = {}
+            self._status = set()
             self._update_member_cache()
             self._update_channel_cache()
 
-            ts = str(datetime.now().timestamp())
-            self._add_logline(3, ts, '', '----- Connected -----')
+            self._add_status(3, '----- Connected -----')
             self._fetch_history()  # This could maybe deferred to speed up startup
         else:
             asyncio.ensure_future(self._reconnect())
 
     async def _reconnect(self):
         self._connected = False
-        ts = str(datetime.now().timestamp())
-        self._add_logline(3, ts, '', '----- Reconnecting -----')
+        self._add_status(3, '----- Reconnecting -----')
 
         if self._sc.rtm_connect():
             self._connected = True
+            self._update_channel_cache()
 
         else:
             await asyncio.sleep(5)
@@ -73,22 +585,43 @@ class LackManager:
         if not self._connected:
             return
 
-        response = self._sc.api_call("channels.list", exclude_archived=1)
+        resolver = ChannelResolver(self._sc.api_call, cache.cache_path("channels.json"), self._sc.server.domain)
 
-        for channel in response['channels']:
+        # After the first lookup a reconnect only needs to refresh the topic it may have missed
+        first_lookup = not self._channel_id
 
-            if channel['name'] == self.channel_name:
-                self._channel_id = channel['id']
-                self.channel_topic = channel['topic']['value']
+        try:
+            self._channel_id, topic = resolver.resolve(self._channel_id or self.channel_name)
+
+        except LookupFailed as e:
+            self._add_status(1, f"----- Couldn't look up {self.channel_name} ({e}), retrying -----")
+            asyncio.ensure_future(self._retry_channel_lookup())
+            return
+
+        self._set_topic(topic)
+
+        if first_lookup and self._channel_id:
+            # Pick up where the last run left off, anything newer is shown under a divider
+            last_read = self._read_markers().get(self._channel_id, "")
+
+            if last_read:
+                self._set_last_read(last_read)
+                self.set_divider(last_read)
 
-        # If we're using a private group, search for that next
         if not self._channel_id:
-            response = self._sc.api_call("groups.list", exclude_archived=1)
-            for group in response['groups']:
+            self._add_status(1, f'----- Channel {self.channel_name} not found -----')
 
-                if group['name'] == self.channel_name:
-                    self._channel_id = group['id']
-                    self.channel_topic = group['topic']['value']
+    async def _retry_channel_lookup(self):
+        await asyncio.sleep(5)
+
+        # a reconnect may have found it in the meantime
+        if self._channel_id:
+            return
+
+        self._update_channel_cache()
+
+        if self._channel_id:
+            self._fetch_history()
 
     def _update_member_cache(self):
         if not self._connected:
@@ -97,12 +630,14 @@ class LackManager:
         members_source = self._sc.api_call("users.list")['members']
 
         color = 1
+        names = {}
 
         for member in members_source:
             self._membercache[member['id']] = {
                 'n': member['name'],
                 'c': color,
             }
+            names[member['id']] = member['name']
 
             color += 1
             if color == 7:
@@ -110,53 +645,29 @@ class LackManager:
             elif color == 15:
                 color = 1
 
+        self._set_members(names)
+
     def _fetch_history(self):
 
-        method = "channels.history"
+        if not self._channel_id:
+            return
 
-        if self._channel_id[0] == 'G':
-            method = "groups.history"
+        response = self._sc.api_call("conversations.history", channel=self._channel_id)
 
-        response = self._sc.api_call(method, channel=self._channel_id)
+        if not response.get('ok'):
+            self._add_status(1, f"----- Couldn't load history: {response.get('error', 'unknown error')} -----")
+            return
 
         history = response['messages']
 
+        # Queue the history up instead of formatting it inline, then hand it to the worker pool as one batch
+        self._pending = []
+
         for evt in history:
             self._process_event(evt, filter_channel=False)
 
-    def _add_logline(self, color, ts, name, text):
-
-        text = html.unescape(text)
-        result = re.findall(self.username_re, text)
-
-        for r in result:
-            text = re.sub('<@' + r + '>', '@' + self._membercache[r]['n'], text)
-
-        tz = pytz.timezone(self._tz)
-        posix_timestamp, _ = ts.split('.')
-        posix_timestamp = int(posix_timestamp)
-        utc_dt = datetime.fromtimestamp(posix_timestamp)
-        dt = utc_dt.astimezone(tz)
-        date = dt.strftime('%a %I:%M%p')
-
-        prefix = f"{date} {name}: "
-
-        paragraphs = f"{prefix}{text}".split("\n")
-        leading_pad = " " * len(prefix)
-
-        for p_i, p in enumerate(paragraphs):
-
-            wrapper = TextWrapper(subsequent_indent=leading_pad,
-                                  width=self.output_width)
-
-            if p_i > 0:
-                p = leading_pad + p
-
-            lines = wrapper.wrap(p)
-
-            for l in lines:
-                self.loglines[str(ts)] = (color, f"{l}")
-                ts = float(ts) + 0.000001
+        pending, self._pending = self._pending, None
+        asyncio.ensure_future(self._format_batch(pending))
 
     def _process_event(self, evt, filter_channel=True):
 
@@ -170,34 +681,112 @@ class LackManager:
             if evt.get('type') and evt['type'] == 'message':
                 if not filter_channel or (filter_channel and evt['channel'] == self._channel_id):
 
-                    if evt.get('message'):  # message has been edited
+                    if evt.get('subtype') in ('channel_topic', 'group_topic'):
+                        self._set_topic(evt['topic'])
+
+                    if evt.get('subtype') == 'message_replied':
+                        # the reply itself arrives as a message of its own, this only carries the new count
+                        m = evt['message']
+                        self._set_reply_count(m['ts'], m.get('reply_count', 0))
+
+                    elif evt.get('message'):  # message has been edited
                         m = evt['message']
-                        orig_ts = m['ts']
                         user = m['user']
                         text = m['text'] + " (edited)"
-                        self._add_logline(self._membercache[user]['c'],
-                                          orig_ts,
+                        self._add_message(m,
+                                          self._membercache[user]['c'],
                                           self._membercache[user]['n'],
                                           text)
 
                     elif evt.get('deleted_ts'):
-                        del self.loglines[evt['deleted_ts']]
-
-                    elif evt.get('user'):
-                        # messages from other users
-                        self._add_logline(self._membercache[evt['user']]['c'],
-                                          evt['ts'],
-                                          self._membercache[evt['user']]['n'],
-                                          evt['text'])
+                        self._remove_logline(evt['deleted_ts'])
 
                     else:
-                        # messages from us
-                        self._add_logline(7, evt['ts'], evt['username'], evt['text'])
+                        self._add_message(evt, *self._author(evt), evt['text'])
+
+            elif evt.get('type') in ('reaction_added', 'reaction_removed'):
+                item = evt['item']
+
+                if item.get('type') == 'message' and item['channel'] == self._channel_id:
+                    self._react(item['ts'], evt['reaction'], 1 if evt['type'] == 'reaction_added' else -1)
 
         except KeyError as e:
             pass
             # self.loglines.append((1, 'Key Error: {}'.format(e)))
 
+    def _author(self, m) -> Tuple[int, str]:
+        if m.get('user'):
+            # messages from other users
+            return self._membercache[m['user']]['c'], self._membercache[m['user']]['n']
+
+        # messages from us
+        return 7, m['username']
+
+    def fetch_replies(self, ts: str) -> None:
+
+        if not self._channel_id:
+            return
+
+        replies = []
+        cursor = None
+
+        while True:
+            page = {'cursor': cursor} if cursor else {}
+            response = self._sc.api_call("conversations.replies", channel=self._channel_id, ts=ts, limit=200, **page)
+
+            if not response.get('ok'):
+                self._add_status(1, f"----- Couldn't load replies: {response.get('error', 'unknown error')} -----")
+                return
+
+            for m in response['messages']:
+                # every page starts with the parent
+                if m['ts'] == ts:
+                    continue
+
+                try:
+                    color, name = self._author(m)
+                except KeyError:
+                    continue
+
+                replies.append((color, m['ts'], name, m['text']))
+
+            cursor = response.get('response_metadata', {}).get('next_cursor')
+
+            if not cursor:
+                break
+
+        self._add_replies(ts, replies)
+
+    def _add_message(self, m, color, name, text):
+        ts = m['ts']
+
+        if m.get('thread_ts', ts) != ts:
+            self._add_reply(m['thread_ts'], color, ts, name, text)
+            return
+
+        self._add_logline(color, ts, name, text)
+
+        if m.get('reactions'):
+            self._set_reactions(ts, {r['name']: r['count'] for r in m['reactions']})
+
+        if m.get('reply_count'):
+            self._set_reply_count(ts, m['reply_count'])
+
+    def _read_markers(self) -> Dict[str, str]:
+        return cache.load(cache.cache_path("read.json")).get(self._sc.server.domain or 'default', {})
+
+    def _send_read_marker(self, ts: str) -> None:
+        if not self._channel_id:
+            return
+
+        path = cache.cache_path("read.json")
+        markers = cache.load(path)
+        markers.setdefault(self._sc.server.domain or 'default', {})[self._channel_id] = ts
+        cache.save(path, markers)
+
+        if self._connected:
+            self._sc.api_call("conversations.mark", channel=self._channel_id, ts=ts)
+
     async def send_message(self, msg):
 
         if not self._connected:
@@ -0,0 +1,225 @@
+import sys
+from bisect import bisect_right
+from typing import Iterator, List, Tuple, Union
+
+from sortedcontainers import SortedDict
+
+from .cellwidth import text_width
+from .markup import PLAIN, Line, span_length
+
+"""
+The message log. Each message is stored once with its header (date, author, color) and its wrapped body lines; the
+"Day HH:MMpm name: " prefix and the padding under it are only put together when a line is drawn. Lines that are a
+single unstyled span are kept as a bare str, which is most of them.
+
+Below the body a message can have a footer (reactions, thread summary and replies). It's kept apart from the body so
+it can be swapped out as reactions and replies come in without rewrapping the message.
+"""
+
+CompactLine = Union[str, Line]
+
+
+class LogMessage:
+    __slots__ = ('date', 'name', 'color', 'lines', 'footer', 'width', 'footer_width')
+
+    def __init__(self,
+                 date: str,
+                 name: str,
+                 color: int,
+                 lines: Tuple[CompactLine, ...],
+                 footer: Tuple[Line, ...] = ()) -> None:
+        self.date = date
+        self.name = name
+        self.color = color
+        self.lines = lines
+
+        # Widest body line in cells, header included, so drawing can tell whether anything needs truncating without
+        # measuring every line every frame
+        self.width = self.prefix_width + max((text_width(line) if line.__class__ is str else span_length(line)
+                                              for line in lines), default=0)
+        self.set_footer(footer)
+
+    def __len__(self) -> int:
+        return len(self.lines) + len(self.footer)
+
+    @classmethod
+    def from_spans(cls, date: str, name: str, color: int, lines: List[Line]) -> 'LogMessage':
+        compact = tuple(line[0][1] if len(line) == 1 and line[0][0] == PLAIN else line for line in lines)
+        return cls(date, name, color, compact)
+
+    def set_footer(self, footer: Tuple[Line, ...]) -> None:
+        self.footer = footer
+        self.footer_width = self.prefix_width + max(map(span_length, footer), default=0)
+
+    @property
+    def prefix(self) -> str:
+        return f"{self.date} {self.name}: "
+
+    @property
+    def prefix_width(self) -> int:
+        return text_width(self.date) + text_width(self.name) + 3
+
+    def line(self, index: int) -> Line:
+        """
+        The spans for one line of the message, with the header or padding in front of it.
+        """
+
+        if index >= len(self.lines):
+            return ((PLAIN, _padding(self.prefix_width)),) + self.footer[index - len(self.lines)]
+
+        line = self.lines[index]
+
+        if index == 0:
+            lead = (PLAIN, self.prefix)
+        else:
+            lead = (PLAIN, _padding(self.prefix_width))
+
+        if line.__class__ is str:
+            return lead, (PLAIN, line)
+
+        return (lead,) + line
+
+
+_paddings: dict = {}
+
+
+def _padding(width: int) -> str:
+    padding = _paddings.get(width)
+
+    if padding is None:
+        padding = _paddings[width] = " " * width
+
+    return padding
+
+
+class LogStore:
+    """
+    Messages ordered by ts, addressable by line number for drawing. Line offsets are rebuilt lazily from the first
+    message that changed, so appending new messages at the bottom stays cheap.
+    """
+
+    def __init__(self) -> None:
+        self._messages = SortedDict()
+        self._offsets: List[int] = []
+        self._length = 0
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __contains__(self, ts: str) -> bool:
+        return ts in self._messages
+
+    def __getitem__(self, ts: str) -> LogMessage:
+        return self._messages[ts]
+
+    def add(self, ts: str, message: LogMessage) -> None:
+        # names and dates repeat across thousands of messages, share one copy of each
+        message.name = sys.intern(message.name)
+        message.date = sys.intern(message.date)
+
+        old = self._messages.get(ts)
+
+        if old is not None:
+            self._length -= len(old)
+
+        self._messages[ts] = message
+        self._length += len(message)
+        self._invalidate(self._messages.bisect_left(ts))
+
+    def set_footer(self, ts: str, footer: Tuple[Line, ...]) -> None:
+        message = self._messages.get(ts)
+
+        if message is None or message.footer == footer:
+            return
+
+        # Reaction counts and the like change far more often than the number of lines, which is all the offsets need
+        if len(footer) != len(message.footer):
+            self._length += len(footer) - len(message.footer)
+            self._invalidate(self._messages.bisect_left(ts))
+
+        message.set_footer(footer)
+
+    def remove(self, ts: str) -> None:
+        if ts not in self._messages:
+            return
+
+        self._invalidate(self._messages.bisect_left(ts))
+        self._length -= len(self._messages.pop(ts))
+
+    def clear(self) -> None:
+        self._messages.clear()
+        self._offsets = []
+        self._length = 0
+
+    def _invalidate(self, position: int) -> None:
+        del self._offsets[position:]
+
+    def _index(self) -> List[int]:
+        offsets = self._offsets
+        count = len(self._messages)
+
+        if len(offsets) < count:
+            valid = len(offsets)
+            total = offsets[-1] + len(self._messages.peekitem(valid - 1)[1]) if valid else 0
+
+            for message in self._messages.values()[valid:]:
+                offsets.append(total)
+                total += len(message)
+
+        return offsets
+
+    def locate(self, line: int) -> Tuple[str, int]:
+        """
+        (ts, line index within the message) for a line number.
+        """
+
+        offsets = self._index()
+        position = bisect_right(offsets, line) - 1
+        return self._messages.peekitem(position)[0], line - offsets[position]
+
+    def line_of(self, ts: str) -> int:
+        """
+        The line the message at ts starts on, or where it would go if it isn't in the log.
+        """
+
+        offsets = self._index()
+        position = self._messages.bisect_left(ts)
+        return offsets[position] if position < len(offsets) else self._length
+
+    def before(self, ts: str) -> Iterator[str]:
+        """
+        The ts of every message up to and including ts, newest first.
+        """
+
+        return self._messages.irange(maximum=ts, reverse=True)
+
+    def count_after(self, ts: str) -> int:
+        """
+        How many messages are newer than ts.
+        """
+
+        return len(self._messages) - self._messages.bisect_right(ts)
+
+    def lines(self, start: int, stop: int) -> Iterator[Tuple[LogMessage, int]]:
+        """
+        (message, line index) for every line from start up to stop.
+        """
+
+        if start >= stop or start >= self._length:
+            return
+
+        offsets = self._index()
+        position = bisect_right(offsets, start) - 1
+        line_no = start
+
+        while line_no < stop and position < len(offsets):
+            message = self._messages.peekitem(position)[1]
+
+            for index in range(line_no - offsets[position], len(message)):
+                if line_no >= stop:
+                    return
+
+                yield message, index
+                line_no += 1
+
+            position += 1
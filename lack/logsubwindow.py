@@ -2,15 +2,27 @@ import asyncio
 import curses
 import math
 from datetime import datetime
-from typing import Any
+from typing import Any, Optional, Tuple
 
+from . import markup
+from .lackmanager import LogManager
+from .logstore import LogStore
 from .window import BorderedSubWindow
 
-from sortedcontainers import SortedDict
-
 DOWN = 1
 UP = -1
 
+# curses attributes for each markup style flag
+STYLE_ATTRS = {
+    markup.BOLD: curses.A_BOLD,
+    markup.ITALIC: getattr(curses, 'A_ITALIC', curses.A_DIM),
+    markup.STRIKE: curses.A_DIM,
+    markup.CODE: curses.A_REVERSE,
+    markup.LINK: curses.A_UNDERLINE,
+    markup.MENTION: curses.A_BOLD | curses.A_STANDOUT,
+    markup.CHANNEL: curses.A_UNDERLINE,
+}
+
 
 class LogSubWindow(BorderedSubWindow):
     def __init__(self,
@@ -19,18 +31,27 @@ class LogSubWindow(BorderedSubWindow):
                  width: int = 0,
                  top: int = 0,
                  left: int = 0,
-                 datasource: SortedDict = SortedDict()) -> None:
+                 datasource: LogStore = LogStore(),
+                 manager: Optional[LogManager] = None) -> None:
 
         super(LogSubWindow, self).__init__(window, height, width, top, left)
 
         self.datasource = datasource
+        self.manager = manager
         self.topline = 0
         self.last_log_length = 0
         self.log_length = 0
 
+        # Stick to the bottom as messages come in. Once scrolled up, the view stays on the message at its top.
+        self.following = True
+        self._anchor: Optional[Tuple[str, int]] = None
+
         self.scrollbar_x = self.width
         self.line_length = self.width - 1
 
+        # style flags -> combined curses attribute, filled in as styles are seen
+        self._attrs = {markup.PLAIN: curses.A_NORMAL}
+
     def key_handler(self, ch):
         if ch == curses.KEY_UP:
             self.log_up_down(UP)
@@ -49,6 +70,41 @@ class LogSubWindow(BorderedSubWindow):
         elif self.topline < scroll_max and increment == DOWN:
             self.topline += 1
 
+        self.following = self.topline >= scroll_max
+
+    def thread_in_view(self) -> Optional[str]:
+        """
+        The lowest message on screen that has a thread, if there is one.
+        """
+
+        if self.manager is None:
+            return None
+
+        line = min(self.topline + self.height, len(self.datasource)) - 1
+
+        while line >= self.topline:
+            ts, index = self.datasource.locate(line)
+
+            if self.manager.has_thread(ts):
+                return ts
+
+            line -= index + 1
+
+        return None
+
+    def _attr(self, style: int) -> int:
+        attr = self._attrs.get(style)
+
+        if attr is None:
+            attr = curses.A_NORMAL
+            for flag, flag_attr in STYLE_ATTRS.items():
+                if style & flag:
+                    attr |= flag_attr
+
+            self._attrs[style] = attr
+
+        return attr
+
     def _draw_scrollbar(self):
         self.window.vline(1,
                           self.scrollbar_x - 1,
@@ -81,29 +137,79 @@ class LogSubWindow(BorderedSubWindow):
                               curses.ACS_CKBOARD,
                               scrollbar_length)
 
+    def _draw_unread(self, count: int) -> None:
+        # Shown on the bottom border, clear of the scrollbar
+        self.window.hline(self.height + 1, 1, curses.ACS_HLINE, self.width - 2)
+
+        if count:
+            text = f" {count} new {'message' if count == 1 else 'messages'} "
+            self.window.addstr(self.height + 1, max(self.width - 2 - len(text), 1), text, curses.A_REVERSE)
+
+    def _scroll_to_new_content(self) -> None:
+        scroll_max = max(self.log_length - self.height, 0)
+
+        if self.following:
+            self.topline = scroll_max
+            divider = self.manager.divider_ts if self.manager is not None else None
+
+            # Don't run past the divider, the last message read stays at the top until the rest has been seen
+            if divider is not None and divider in self.datasource and self.datasource.count_after(divider):
+                self.topline = min(self.topline, self.datasource.line_of(divider))
+
+        elif self._anchor is not None:
+            ts, index = self._anchor
+            self.topline = min(self.datasource.line_of(ts) + index, scroll_max)
+
+    def _update_read_marker(self, bottom: int) -> None:
+        manager = self.manager
+        ts = manager.last_message(self.datasource.locate(bottom - 1)[0])
+
+        if ts is not None:
+            manager.mark_read(ts)
+
+        divider = manager.divider_ts
+
+        if divider is None:
+            # New messages came in below while scrolled up, mark where they start
+            if not self.following and manager.unread_count():
+                manager.set_divider(manager.last_read)
+
+        elif self.following and self.datasource.line_of(divider) < self.topline:
+            # Caught up and the divider has scrolled off the top
+            manager.set_divider(None)
+
     def _content(self) -> None:
 
         self.log_length = len(self.datasource)
 
-        if self.log_length != self.last_log_length and self.log_length > self.height:
-            self.topline = self.log_length - self.height
+        if self.log_length != self.last_log_length:
+            self._scroll_to_new_content()
 
         bottom = self.topline + self.height
 
         if bottom > self.log_length:
             bottom = self.log_length
 
-        log_keys = self.datasource.iloc[self.topline:bottom]
+        log_lines = self.datasource.lines(self.topline, bottom)
 
-        for (index, ts) in enumerate(log_keys):
+        for (index, (message, line_no)) in enumerate(log_lines):
 
-            color, msg = self.datasource[ts]
+            spans = message.line(line_no)
+            width = message.width if line_no < len(message.lines) else message.footer_width
 
-            if len(msg) > self.line_length:
-                msg = msg[0:self.line_length]
+            if width > self.line_length:
+                spans = markup.truncate_spans(spans, self.line_length)
 
-            self.set_text(index, 0, msg, color, clr=True)
+            self.set_spans(index, 0, [(self._attr(style), text) for style, text in spans], message.color, clr=True)
 
         self.last_log_length = self.log_length
+        self.following = self.topline >= self.log_length - self.height
+
+        if self.log_length:
+            self._anchor = self.datasource.locate(self.topline)
+
+            if self.manager is not None:
+                self._update_read_marker(bottom)
+                self._draw_unread(self.manager.unread_count())
 
         self._draw_scrollbar()
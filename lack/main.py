@@ -28,6 +28,11 @@ signal.signal(signal.SIGINT, exit_handler)
 
 
 def main() -> None:
+    if '--daemon' in sys.argv[1:]:
+        from .lackdaemon import main as daemon_main
+        daemon_main()
+        return
+
     def _main(window: Any) -> None:
         event_loop = asyncio.get_event_loop()
 
@@ -1,6 +1,12 @@
 import asyncio
 import curses
+import curses.ascii
+import sys
+from typing import Any
 
+import os
+
+from .lackclient import LackClient
 from .lackmanager import LackManager
 from .logsubwindow import LogSubWindow
 from .window import PromptSubWindow, PanelWindow
@@ -10,14 +16,25 @@ class LackMainWindow(PanelWindow):
     def __init__(self, height: int, width: int, top: int, left: int, fg=curses.COLOR_WHITE) -> None:
         super(LackMainWindow, self).__init__(height, width, top, left, fg)
 
-        logwin_height = self.height - 4
-        logwin_width = self.width
+        self._resized = False
+
+        # With SLACK_SOCKET set we attach to a running `lack --daemon` rather than connecting to Slack ourselves
+        if os.getenv("SLACK_SOCKET"):
+            self.lack_manager = LackClient(self.width)
+        else:
+            self.lack_manager = LackManager(self.width)
+
+        self._layout()
 
-        self.lack_manager = LackManager(logwin_width)
+        asyncio.ensure_future(self.draw())
+
+    def _layout(self) -> None:
+        logwin_height = self.height - 4
 
         self.logwin = LogSubWindow(self,
                                    height=logwin_height,
-                                   datasource=self.lack_manager.loglines)
+                                   datasource=self.lack_manager.loglines,
+                                   manager=self.lack_manager)
 
         self.promptwin = PromptSubWindow(self,
                                          height=4,
@@ -25,12 +42,33 @@ class LackMainWindow(PanelWindow):
 
         self.promptwin.parent_key_handler = self.key_handler
 
-        asyncio.ensure_future(self.draw())
+    def _resize_handler(self, signum: Any, frame: Any) -> None:
+        # Only note it here, the windows are rebuilt on the next draw rather than in the middle of one
+        self._resized = True
+
+    def _resize(self) -> None:
+        cols, rows = os.get_terminal_size(sys.__stdout__.fileno())
+
+        curses.resizeterm(rows, cols)
+        self.window.resize(rows, cols)
+        self.height, self.width = rows, cols
+        self.window.erase()
+
+        # Subwindows can't follow their parent's size, so they're made again. The log is rewrapped for the new
+        # width on the worker pool.
+        self._layout()
+        self.lack_manager.reflow(self.width)
 
     def key_handler(self, ch: int) -> int:
 
         ch = super(LackMainWindow, self).key_handler(ch)
 
+        if ch == curses.ascii.TAB:
+            ts = self.logwin.thread_in_view()
+
+            if ts is not None:
+                self.lack_manager.toggle_thread(ts)
+
         ch = self.logwin.key_handler(ch)
 
         return ch
@@ -39,6 +77,10 @@ class LackMainWindow(PanelWindow):
 
         await asyncio.sleep(0.05)
 
+        if self._resized:
+            self._resized = False
+            self._resize()
+
         if self.visible():
             self.logwin.draw()
 
@@ -0,0 +1,259 @@
+import html
+import re
+from typing import Dict, List, Tuple
+
+from .cellwidth import is_narrow, split_at, text_width
+
+"""
+Slack markup parsing. Message text is turned into a list of (style, text) spans once, when the message is formatted,
+so the log window only has to map styles to curses attributes when it draws. Styles are bit flags and this module
+doesn't import curses, which keeps it usable from the formatting worker pool.
+
+Lengths and widths here are in terminal cells (see cellwidth), not characters.
+"""
+
+PLAIN = 0
+BOLD = 1
+ITALIC = 2
+STRIKE = 4
+CODE = 8
+LINK = 16
+MENTION = 32
+CHANNEL = 64
+
+Span = Tuple[int, str]
+Line = Tuple[Span, ...]
+
+_MARKUP_RE = re.compile(r'<(?P<entity>[^<>\n]+)>'
+                        r'|```(?P<pre>.+?)```'
+                        r'|`(?P<code>[^`\n]+)`'
+                        r'|(?<![\w*])\*(?P<bold>\S(?:[^*\n]*\S)?)\*(?!\w)'
+                        r'|(?<![\w_])_(?P<italic>\S(?:[^_\n]*\S)?)_(?!\w)'
+                        r'|(?<![\w~])~(?P<strike>\S(?:[^~\n]*\S)?)~(?!\w)',
+                        re.DOTALL)
+
+_WHITESPACE_RE = re.compile(r'(\s+)')
+
+_FLAGS = {
+    'bold': BOLD,
+    'italic': ITALIC,
+    'strike': STRIKE,
+}
+
+
+def parse(text: str, members: Dict[str, str], style: int = PLAIN) -> List[Span]:
+    """
+    Turn Slack message text into spans. User mentions are resolved through members (user id -> name), channel
+    references and links are decoded to their labels.
+    """
+
+    spans: List[Span] = []
+    pos = 0
+
+    for match in _MARKUP_RE.finditer(text):
+        if match.start() > pos:
+            spans.append((style, html.unescape(text[pos:match.start()])))
+
+        kind = match.lastgroup
+        value = match.group(kind)
+
+        if kind == 'entity':
+            spans.append(_entity(value, members, style))
+
+        elif kind in ('pre', 'code'):
+            spans.append((style | CODE, html.unescape(value)))
+
+        else:
+            spans.extend(parse(value, members, style | _FLAGS[kind]))
+
+        pos = match.end()
+
+    if pos < len(text):
+        spans.append((style, html.unescape(text[pos:])))
+
+    return spans
+
+
+def _entity(value: str, members: Dict[str, str], style: int) -> Span:
+    target, _, label = value.partition('|')
+    label = html.unescape(label)
+
+    if target.startswith('@'):
+        user_id = target[1:]
+        return style | MENTION, '@' + (label or members.get(user_id, user_id))
+
+    elif target.startswith('#'):
+        return style | CHANNEL, '#' + (label or target[1:])
+
+    elif target.startswith('!'):
+        # <!here>, <!channel>, <!subteam^ID|@team>
+        return style | MENTION, label or '@' + target[1:]
+
+    return style | LINK, label or html.unescape(target)
+
+
+def span_length(spans: Line) -> int:
+    return sum(text_width(text) for _, text in spans)
+
+
+def truncate_spans(spans: Line, length: int) -> Line:
+    """
+    Cut a line of spans down to at most length cells.
+    """
+
+    result = []
+
+    for style, text in spans:
+        if length <= 0:
+            break
+
+        text, rest = split_at(text, length)
+
+        # a wide character that doesn't fit leaves nothing of the span
+        if text:
+            result.append((style, text))
+
+        if rest:
+            break
+
+        length -= text_width(text)
+
+    return tuple(result)
+
+
+def _merge(spans: List[Span]) -> Line:
+    merged: List[Span] = []
+
+    for style, text in spans:
+        if merged and merged[-1][0] == style:
+            merged[-1] = (style, merged[-1][1] + text)
+        else:
+            merged.append((style, text))
+
+    return tuple(merged)
+
+
+def _words(spans: List[Span]):
+    """
+    Split a paragraph into (is_space, pieces, length) tokens. A word can be made of several pieces when the style
+    changes in the middle of it.
+    """
+
+    word: List[Span] = []
+    word_length = 0
+
+    for style, text in spans:
+        measure = len if is_narrow(text) else text_width
+
+        for chunk in _WHITESPACE_RE.split(text):
+            if not chunk:
+                continue
+
+            if chunk.isspace():
+                if word:
+                    yield False, word, word_length
+                    word, word_length = [], 0
+
+                yield True, [(style, ' ' * len(chunk))], len(chunk)
+
+            else:
+                word.append((style, chunk))
+                word_length += measure(chunk)
+
+    if word:
+        yield False, word, word_length
+
+
+def wrap_spans(spans: List[Span], width: int, indent: int = 0) -> List[Line]:
+    """
+    Word wrap spans to width, following the same rules as TextWrapper: whitespace is dropped at line breaks, words
+    longer than a line are broken and newlines start a new paragraph. Every line starts at column indent, which is
+    left for the caller to fill in when the line is drawn.
+    """
+
+    paragraphs: List[List[Span]] = [[]]
+
+    for style, text in spans:
+        for i, part in enumerate(text.split('\n')):
+            if i > 0:
+                paragraphs.append([])
+            if part:
+                paragraphs[-1].append((style, part))
+
+    lines: List[Line] = []
+
+    for paragraph in paragraphs:
+        current: List[Span] = []
+        current_length = indent
+        has_words = False
+        broken = False
+
+        for is_space, pieces, length in _words(paragraph):
+
+            if is_space:
+                # whitespace survives at the start of a paragraph and between words, but not at a line break
+                if has_words or not broken:
+                    current.extend(pieces)
+                    current_length += length
+                continue
+
+            # words longer than a whole line are broken up starting on the current line, shorter ones move down
+            while current_length + length > width > indent:
+                room = width - current_length
+
+                if room > 0 and length > width - indent:
+                    head, pieces = _split_pieces(pieces, room)
+
+                    if not head and current_length == indent:
+                        # a wide character on a line only one cell wide, let it overflow rather than never fit
+                        head, pieces = _split_pieces(pieces, 2)
+
+                    current.extend(head)
+                    length -= span_length(head)
+
+                elif has_words:
+                    while current and current[-1][1].isspace():
+                        current.pop()
+
+                else:
+                    # nothing but leading whitespace on this line, which goes rather than the word
+                    current, current_length = [], indent
+                    continue
+
+                lines.append(_merge(current))
+                current, current_length = [], indent
+                has_words = False
+                broken = True
+
+            if pieces:
+                current.extend(pieces)
+                current_length += length
+                has_words = True
+
+        while current and current[-1][1].isspace():
+            current.pop()
+
+        # the first line is always there, even when empty, as it's where the message header goes
+        if has_words or not lines:
+            lines.append(_merge(current))
+
+    return lines
+
+
+def _split_pieces(pieces: List[Span], length: int) -> Tuple[List[Span], List[Span]]:
+    head: List[Span] = []
+
+    for i, (style, text) in enumerate(pieces):
+        width = text_width(text)
+
+        if width >= length:
+            text, rest = split_at(text, length)
+            if text:
+                head.append((style, text))
+            tail = [(style, rest)] if rest else []
+            return head, tail + pieces[i + 1:]
+
+        head.append((style, text))
+        length -= width
+
+    return head, []
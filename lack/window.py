@@ -2,7 +2,7 @@ import curses
 import signal
 from curses import panel, ascii
 from curses.textpad import Textbox
-from typing import Callable, Optional, Any, Union
+from typing import Callable, Optional, Any, Union, Sequence, Tuple
 
 """
 Some ideas taken from https://github.com/konsulko/tizen-distro/blob/master/bitbake/lib/bb/ui/ncurses.py
@@ -127,6 +127,28 @@ class SubWindow(object):
 
         self.window.attroff(curses.color_pair(color))
 
+    def set_spans(self,
+                  y: int,
+                  x: int,
+                  spans: Sequence[Tuple[int, str]],
+                  color: int = curses.COLOR_WHITE,
+                  clr: bool = False) -> None:
+        """
+        Like set_text, but for a line made of (attr, text) spans. Each span is drawn with its own curses attributes
+        on top of the line color.
+        """
+
+        color_attr = curses.color_pair(color)
+
+        self.window.move(y, x)
+
+        for attr, text in spans:
+            self.window.addstr(text, color_attr | attr)
+
+        if clr:
+            cy, cx = self.window.getyx()
+            self.window.hline(cy, cx, ' ', self.width - cx)
+
     def draw(self) -> None:
         self._before_content()
         self._top_content()
@@ -180,6 +202,14 @@ class BorderedSubWindow(SubWindow):
                  *args: Any) -> None:
         super(BorderedSubWindow, self).set_text(y + 1, x + 1, text, color=color, clr=clr, *args)
 
+    def set_spans(self,
+                  y: int,
+                  x: int,
+                  spans: Sequence[Tuple[int, str]],
+                  color: int = curses.COLOR_WHITE,
+                  clr: bool = False) -> None:
+        super(BorderedSubWindow, self).set_spans(y + 1, x + 1, spans, color=color, clr=clr)
+
     def hline(self, y: int, x: int, width: int) -> None:
         self.window.hline(y + 1, x + 1, curses.ACS_HLINE, width)
 
@@ -0,0 +1,86 @@
+import os
+import unicodedata
+
+import pytest
+
+from lack import cellwidth, widthtable
+from lack.cellwidth import is_narrow, split_at, text_width
+from lack.logstore import LogMessage
+from lack.markup import PLAIN, span_length, truncate_spans, wrap_spans
+
+
+@pytest.mark.skipif(f'Unicode {unicodedata.unidata_version}.' not in widthtable.__doc__,
+                    reason="widthtable.py was generated from another Unicode version")
+def test_table_is_generated():
+    with open(os.path.join(os.path.dirname(cellwidth.__file__), 'widthtable.py')) as f:
+        assert f.read() == cellwidth._generate()
+
+
+@pytest.mark.parametrize('text, width', [
+    ('', 0),
+    ('plain ascii', 11),
+    ('日本語', 6),
+    ('한국어', 6),
+    ('ｆｕｌｌ', 8),
+    ('café', 4),
+    ('cafe\u0301', 4),  # combining acute
+    ('\u1100\u1161', 2),  # Hangul syllable spelled out in jamo
+    ('👍', 2),
+    ('👍🏽', 4),
+    ('a\u200bb', 2),  # zero width space
+    ('\xad', 1),  # soft hyphen is drawn
+    ('Ελληνικά', 8),
+])
+def test_text_width(text, width):
+    assert text_width(text) == width
+
+
+def test_is_narrow():
+    assert is_narrow('plain ascii ~!')
+    assert not is_narrow('café')
+    assert not is_narrow('tab\there')
+
+
+@pytest.mark.parametrize('text, cells, head', [
+    ('abcdef', 3, 'abc'),
+    ('日本語', 3, '日'),
+    ('日本語', 4, '日本'),
+    ('ab日本', 3, 'ab'),
+    ('e\u0301x', 1, 'e\u0301'),  # the mark stays with its letter
+    ('日本語', 10, '日本語'),
+])
+def test_split_at(text, cells, head):
+    assert split_at(text, cells) == (head, text[len(head):])
+
+
+@pytest.mark.parametrize('width', [1, 2, 3, 7, 20])
+def test_wrap_wide_text_fits(width):
+    text = '日本語のテキストです 한국어 메시지 mixed with ascii 👍🏽 and ｆｕｌｌ width'
+    lines = wrap_spans([(PLAIN, text)], width)
+
+    # a wide character can only overflow a line one cell wide
+    assert all(span_length(line) <= max(width, 2) for line in lines)
+    assert "".join(part for line in lines for _, part in line).replace(' ', '') == text.replace(' ', '')
+
+
+def test_wrap_counts_cells():
+    assert wrap_spans([(PLAIN, '日本語 テスト')], 7) == [((PLAIN, '日本語'),), ((PLAIN, 'テスト'),)]
+    assert wrap_spans([(PLAIN, '日本語 テスト')], 13) == [((PLAIN, '日本語 テスト'),)]
+
+
+def test_truncate_wide():
+    assert truncate_spans(((PLAIN, 'ab'), (PLAIN, '日本')), 3) == ((PLAIN, 'ab'),)
+    assert truncate_spans(((PLAIN, 'ab'), (PLAIN, '日本')), 4) == ((PLAIN, 'ab'), (PLAIN, '日'))
+
+
+def test_message_widths_are_stored():
+    message = LogMessage.from_spans('Mon 09:00AM', 'bob', 1, [((PLAIN, 'ascii'),), ((PLAIN, '日本語'), (PLAIN, 'テスト'))])
+    prefix = len('Mon 09:00AM bob: ')
+
+    assert message.width == prefix + 12
+    assert message.footer_width == prefix
+
+    message.set_footer((((PLAIN, '👍 2'),), ((PLAIN, 'a'),)))
+
+    assert message.footer_width == prefix + 4
+    assert message.width == prefix + 12
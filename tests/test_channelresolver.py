@@ -0,0 +1,146 @@
+import pytest
+
+from lack.channelresolver import PAGE_SIZE, ChannelResolver, LookupFailed
+
+
+class FakeApi:
+    """
+    conversations.info and a paged conversations.list over a list of channels. Responses can be overridden per
+    method with a list of canned replies, which are used up in order.
+    """
+
+    def __init__(self, channels):
+        self.channels = channels
+        self.calls = []
+        self.canned = {}
+
+    def __call__(self, method, **params):
+        self.calls.append((method, params))
+
+        if self.canned.get(method):
+            return self.canned[method].pop(0)
+
+        if method == 'conversations.info':
+            for channel in self.channels:
+                if channel['id'] == params['channel']:
+                    return {'ok': True, 'channel': channel}
+
+            return {'ok': False, 'error': 'channel_not_found'}
+
+        if method == 'conversations.list':
+            start = int(params.get('cursor') or 0)
+            end = start + params['limit']
+            next_cursor = str(end) if end < len(self.channels) else ''
+            return {'ok': True, 'channels': self.channels[start:end], 'response_metadata': {'next_cursor': next_cursor}}
+
+        raise AssertionError(method)
+
+    def count(self, method):
+        return sum(1 for called, _ in self.calls if called == method)
+
+
+def channel(i, name=None, topic=''):
+    return {'id': f'C{i:08d}', 'name': name or f'channel{i}', 'topic': {'value': topic}}
+
+
+@pytest.fixture
+def index_path(tmp_path):
+    return str(tmp_path / 'channels.json')
+
+
+def test_id_passthrough(index_path):
+    api = FakeApi([channel(1, topic='hello')])
+
+    assert ChannelResolver(api, index_path).resolve('C00000001') == ('C00000001', 'hello')
+    assert api.count('conversations.list') == 0
+
+
+def test_missing_id(index_path):
+    api = FakeApi([])
+
+    assert ChannelResolver(api, index_path).resolve('C00000001') == (None, '')
+
+
+def test_id_kept_on_other_errors(index_path):
+    api = FakeApi([])
+    api.canned['conversations.info'] = [{'ok': False, 'error': 'ratelimited'}]
+
+    assert ChannelResolver(api, index_path).resolve('C00000001') == ('C00000001', '')
+
+
+def test_search_stops_at_the_match(index_path):
+    channels = [channel(i) for i in range(PAGE_SIZE * 5)]
+    channels[PAGE_SIZE + 3] = channel(PAGE_SIZE + 3, 'kiosk', 'the kiosk')
+    api = FakeApi(channels)
+
+    assert ChannelResolver(api, index_path).resolve('#kiosk') == (channels[PAGE_SIZE + 3]['id'], 'the kiosk')
+    assert api.count('conversations.list') == 2
+
+
+def test_not_found(index_path):
+    api = FakeApi([channel(i) for i in range(PAGE_SIZE + 1)])
+
+    assert ChannelResolver(api, index_path).resolve('kiosk') == (None, '')
+    assert api.count('conversations.list') == 2
+
+
+def test_failed_page_is_not_not_found(index_path):
+    api = FakeApi([channel(i) for i in range(PAGE_SIZE * 3)] + [channel(9999, 'kiosk')])
+    api.canned['conversations.list'] = [api('conversations.list', limit=PAGE_SIZE, cursor=''),
+                                        {'ok': False, 'error': 'ratelimited'}]
+    api.calls.clear()
+
+    with pytest.raises(LookupFailed, match='ratelimited'):
+        ChannelResolver(api, index_path).resolve('kiosk')
+
+    # the page that did load was kept
+    assert ChannelResolver(api, index_path).names['channel0'] == 'C00000000'
+
+
+def test_index_persists(index_path):
+    channels = [channel(i) for i in range(PAGE_SIZE * 2)] + [channel(9999, 'kiosk')]
+    api = FakeApi(channels)
+
+    ChannelResolver(api, index_path, 'team').resolve('kiosk')
+    api.calls.clear()
+
+    assert ChannelResolver(api, index_path, 'team').resolve('kiosk') == ('C00009999', '')
+    assert api.calls == [('conversations.info', {'channel': 'C00009999'})]
+
+    # other workspaces have an index of their own
+    ChannelResolver(api, index_path, 'other').resolve('kiosk')
+    assert api.count('conversations.list') == 3
+
+
+def test_renamed_entry_is_dropped(index_path):
+    api = FakeApi([channel(1, 'kiosk'), channel(2, 'lobby')])
+    ChannelResolver(api, index_path).resolve('kiosk')
+
+    # kiosk was renamed and another channel took the name
+    api.channels = [channel(1, 'old-kiosk'), channel(2, 'kiosk')]
+    resolver = ChannelResolver(api, index_path)
+
+    assert resolver.resolve('kiosk') == ('C00000002', '')
+    assert resolver.names['old-kiosk'] == 'C00000001'
+
+
+def test_deleted_entry_is_dropped(index_path):
+    api = FakeApi([channel(1, 'kiosk')])
+    ChannelResolver(api, index_path).resolve('kiosk')
+
+    api.channels = []
+    resolver = ChannelResolver(api, index_path)
+
+    assert resolver.resolve('kiosk') == (None, '')
+    assert 'kiosk' not in resolver.names
+
+
+def test_entry_kept_when_it_cant_be_checked(index_path):
+    api = FakeApi([channel(1, 'kiosk')])
+    ChannelResolver(api, index_path).resolve('kiosk')
+
+    api.canned['conversations.info'] = [{'ok': False, 'error': 'ratelimited'}]
+    api.calls.clear()
+
+    assert ChannelResolver(api, index_path).resolve('kiosk') == ('C00000001', '')
+    assert api.count('conversations.list') == 0
@@ -0,0 +1,153 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from lack.lackmanager import LogManager
+
+
+class StubManager(LogManager):
+    read_marker_delay = 0.05
+    read_marker_max_delay = 0.2
+
+    def __init__(self, output_width=None):
+        super(StubManager, self).__init__(output_width, ThreadPoolExecutor(1) if output_width else None)
+        self.sent = []
+
+    def _send_read_marker(self, ts):
+        self.sent.append(ts)
+
+    def fetch_replies(self, ts):
+        pass
+
+    async def send_message(self, msg):
+        pass
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    yield loop
+    loop.close()
+    asyncio.set_event_loop(None)
+
+
+def ts(i):
+    return f'{1500000000 + i}.000100'
+
+
+def test_quick_marks_send_once(loop):
+    manager = StubManager()
+
+    async def scroll():
+        for i in range(1000):
+            manager.mark_read(ts(i))
+
+            if i % 100 == 0:
+                await asyncio.sleep(0.001)
+
+        await asyncio.sleep(0.1)
+
+    loop.run_until_complete(scroll())
+
+    assert manager.sent == [ts(999)]
+    assert manager.last_read == ts(999)
+
+
+def test_marks_going_back_are_ignored(loop):
+    manager = StubManager()
+
+    async def scroll():
+        manager.mark_read(ts(5))
+        manager.mark_read(ts(3))
+        await asyncio.sleep(0.1)
+
+    loop.run_until_complete(scroll())
+
+    assert manager.sent == [ts(5)]
+
+
+def test_max_delay_flush(loop):
+    manager = StubManager()
+    manager.read_marker_delay = 0.5
+
+    async def keep_scrolling():
+        # never settles for read_marker_delay, but still goes out every read_marker_max_delay
+        for i in range(35):
+            manager.mark_read(ts(i))
+            await asyncio.sleep(0.02)
+
+    loop.run_until_complete(keep_scrolling())
+
+    assert 2 <= len(manager.sent) <= 4
+    assert manager.sent == sorted(manager.sent)
+
+
+def test_status_lines_are_not_marked(loop):
+    manager = StubManager()
+
+    async def scroll():
+        manager._add_status(3, '----- Connected -----')
+        status = manager.status_lines()[0]
+        manager.mark_read(status)
+        await asyncio.sleep(0.1)
+        return status
+
+    status = loop.run_until_complete(scroll())
+
+    assert manager.sent == []
+    assert manager.last_read != status
+
+
+def test_no_marks_while_a_batch_is_merging(loop):
+    manager = StubManager()
+
+    async def scroll():
+        manager._batches = 1
+        manager.mark_read(ts(10))
+        manager._batches = 0
+        await asyncio.sleep(0.1)
+
+    loop.run_until_complete(scroll())
+
+    assert manager.sent == []
+    assert manager.last_read == ''
+
+
+def divider_line(manager):
+    return [''.join(text for _, text in line) for line in manager.loglines[manager.divider_ts].footer]
+
+
+def test_divider_counts_new_messages(loop):
+    manager = StubManager(80)
+
+    for i in range(3):
+        manager._add_logline(1, ts(i), 'bob', f'message {i}')
+
+    manager.set_divider(ts(0))
+    assert divider_line(manager) == ['----- 2 new messages -----']
+
+    manager._add_logline(1, ts(3), 'bob', 'message 3')
+    assert divider_line(manager) == ['----- 3 new messages -----']
+
+    manager._remove_logline(ts(1))
+    assert divider_line(manager) == ['----- 2 new messages -----']
+
+
+def test_divider_left_alone_when_count_is_unchanged(loop):
+    manager = StubManager(80)
+
+    for i in range(3):
+        manager._add_logline(1, ts(i), 'bob', f'message {i}')
+
+    manager.set_divider(ts(0))
+    rebuilt = []
+    update_footer = manager._update_footer
+    manager._update_footer = lambda ts: (rebuilt.append(ts), update_footer(ts))
+
+    # lack's own lines don't count as new messages
+    manager._add_status(3, '----- Reconnecting -----')
+
+    assert manager.divider_ts not in rebuilt
+    assert divider_line(manager) == ['----- 2 new messages -----']
@@ -0,0 +1,154 @@
+import random
+
+from lack.logstore import LogMessage, LogStore
+from lack.markup import BOLD, ITALIC, PLAIN
+
+
+def message(lines=1, footer=0, name='bob'):
+    return LogMessage('Mon 09:00AM', name, 1,
+                      tuple(f'line {i}' for i in range(lines)),
+                      tuple(((ITALIC, f'footer {i}'),) for i in range(footer)))
+
+
+def expected_lines(model):
+    return [(ts, index) for ts in sorted(model) for index in range(len(model[ts]))]
+
+
+def check(store, model):
+    flat = expected_lines(model)
+
+    assert len(store) == len(flat)
+    assert [(message, index) for message, index in store.lines(0, len(store))] == \
+           [(model[ts], index) for ts, index in flat]
+
+    for line, (ts, index) in enumerate(flat):
+        assert store.locate(line) == (ts, index)
+
+    for ts in model:
+        assert store.line_of(ts) == flat.index((ts, 0))
+        assert store.count_after(ts) == sum(1 for other in model if other > ts)
+        assert list(store.before(ts)) == sorted((other for other in model if other <= ts), reverse=True)
+
+
+def test_add_in_order():
+    store = LogStore()
+    model = {}
+
+    for i in range(20):
+        ts = f'1500000000.{i:06d}'
+        model[ts] = message(lines=i % 3 + 1)
+        store.add(ts, model[ts])
+
+    check(store, model)
+
+
+def test_random_updates_stay_consistent():
+    rng = random.Random(1)
+    store = LogStore()
+    model = {}
+
+    for step in range(500):
+        ts = f'15000000{rng.randrange(100):02d}.000100'
+        action = rng.random()
+
+        if action < 0.5:
+            model[ts] = message(lines=rng.randint(1, 4))
+            store.add(ts, model[ts])
+
+        elif action < 0.7:
+            model.pop(ts, None)
+            store.remove(ts)
+
+        elif ts in model:
+            footer = tuple(((PLAIN, 'x'),) for _ in range(rng.randint(0, 3)))
+            store.set_footer(ts, footer)
+            assert model[ts].footer == footer
+
+        # only reading the index now and then lets several invalidations pile up between rebuilds
+        if step % 7 == 0:
+            check(store, model)
+
+    check(store, model)
+
+
+def test_replace_and_clear():
+    store = LogStore()
+    store.add('1.000001', message(lines=3))
+    store.add('2.000001', message(lines=1))
+    store.add('1.000001', message(lines=1, footer=2))
+
+    assert len(store) == 4
+    assert store.locate(3) == ('2.000001', 0)
+
+    store.clear()
+
+    assert len(store) == 0
+    assert list(store.lines(0, 10)) == []
+    assert '1.000001' not in store
+
+
+def test_line_of_missing_ts():
+    store = LogStore()
+    store.add('1.000001', message(lines=2))
+    store.add('3.000001', message(lines=2))
+
+    assert store.line_of('2.000001') == 2
+    assert store.line_of('4.000001') == 4
+
+
+def test_lines_window():
+    store = LogStore()
+    store.add('1.000001', message(lines=3))
+    store.add('2.000001', message(lines=3))
+
+    assert [index for _, index in store.lines(2, 5)] == [2, 0, 1]
+    assert list(store.lines(4, 4)) == []
+    assert list(store.lines(10, 20)) == []
+
+
+def test_message_lines():
+    msg = LogMessage.from_spans('Mon 09:00AM', 'bob', 1, [((PLAIN, 'hello'),), ((PLAIN, 'there '), (BOLD, 'you'))])
+    msg.footer = (((ITALIC, '[+] 2 replies'),),)
+    padding = ' ' * len('Mon 09:00AM bob: ')
+
+    # single plain spans are stored as bare strings
+    assert msg.lines[0] == 'hello'
+
+    assert len(msg) == 3
+    assert msg.line(0) == ((PLAIN, 'Mon 09:00AM bob: '), (PLAIN, 'hello'))
+    assert msg.line(1) == ((PLAIN, padding), (PLAIN, 'there '), (BOLD, 'you'))
+    assert msg.line(2) == ((PLAIN, padding), (ITALIC, '[+] 2 replies'))
+
+
+def test_set_footer_changes_length():
+    store = LogStore()
+    store.add('1.000001', message(lines=2))
+    store.add('2.000001', message(lines=1))
+
+    store.set_footer('1.000001', (((PLAIN, 'a'),), ((PLAIN, 'b'),)))
+
+    assert len(store) == 5
+    assert store.line_of('2.000001') == 4
+    assert store.locate(3) == ('1.000001', 3)
+
+    # footers on messages that aren't there are ignored
+    store.set_footer('9.000001', (((PLAIN, 'a'),),))
+    assert len(store) == 5
+
+
+def test_same_length_footer_keeps_offsets():
+    store = LogStore()
+
+    for i in range(10):
+        store.add(f'{i}.000001', message(lines=2))
+
+    store.set_footer('2.000001', (((PLAIN, ':+1: 1'),),))
+    store.locate(0)
+    offsets = store._offsets[:]
+
+    store.set_footer('2.000001', (((PLAIN, ':+1: 2'),),))
+
+    # nothing after the message moved, so nothing needs rebuilding
+    assert store._offsets == offsets
+    assert store.locate(6) == ('2.000001', 2)
+    assert store['2.000001'].line(2)[-1] == (PLAIN, ':+1: 2')
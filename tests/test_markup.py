@@ -0,0 +1,107 @@
+from textwrap import TextWrapper
+
+import pytest
+
+from lack.markup import (BOLD, CHANNEL, CODE, ITALIC, LINK, MENTION, PLAIN, STRIKE, parse, span_length,
+                         truncate_spans, wrap_spans)
+
+MEMBERS = {'U1': 'alice'}
+
+
+def text(line):
+    return "".join(part for _, part in line)
+
+
+@pytest.mark.parametrize('markup, spans', [
+    ('hi <@U1>', [(PLAIN, 'hi '), (MENTION, '@alice')]),
+    ('<@U2>', [(MENTION, '@U2')]),
+    ('<@U2|bob>', [(MENTION, '@bob')]),
+    ('in <#C1|general>', [(PLAIN, 'in '), (CHANNEL, '#general')]),
+    ('<https://example.com|the site>', [(LINK, 'the site')]),
+    ('<https://example.com/?a=1&amp;b=2>', [(LINK, 'https://example.com/?a=1&b=2')]),
+    ('<!here> <!subteam^S1|@ops>', [(MENTION, '@here'), (PLAIN, ' '), (MENTION, '@ops')]),
+])
+def test_parse_entities(markup, spans):
+    assert parse(markup, MEMBERS) == spans
+
+
+def test_parse_nested_bold_italic():
+    assert parse('*bold _both_ here* and _it *b* x_', MEMBERS) == [
+        (BOLD, 'bold '), (BOLD | ITALIC, 'both'), (BOLD, ' here'),
+        (PLAIN, ' and '),
+        (ITALIC, 'it '), (BOLD | ITALIC, 'b'), (ITALIC, ' x'),
+    ]
+
+
+def test_parse_mention_keeps_style():
+    assert parse('*hey <@U1>*', MEMBERS) == [(BOLD, 'hey '), (BOLD | MENTION, '@alice')]
+
+
+@pytest.mark.parametrize('markup', [
+    'snake_case_name',
+    'open file_name.py and other_file.py',
+    '2 * 3 * 4',
+    'a*b*c',
+    '*unterminated',
+    'x ~ y',
+])
+def test_parse_leaves_plain_text_alone(markup):
+    assert parse(markup, MEMBERS) == [(PLAIN, markup)]
+
+
+def test_parse_strike_and_code():
+    assert parse('~gone~ `code *not bold*` ```pre\n_x_```', MEMBERS) == [
+        (STRIKE, 'gone'), (PLAIN, ' '), (CODE, 'code *not bold*'), (PLAIN, ' '), (CODE, 'pre\n_x_'),
+    ]
+
+
+def test_parse_unescapes():
+    # Slack escapes these three, and an escaped < can't start an entity
+    assert parse('&lt;b&gt; &amp; &lt;@U1&gt;', MEMBERS) == [(PLAIN, '<b> & <@U1>')]
+
+
+@pytest.mark.parametrize('width', [5, 12, 20, 33, 80])
+@pytest.mark.parametrize('indent', [0, 4])
+def test_wrap_matches_textwrapper(width, indent):
+    words = ['a', 'to', 'the', 'quick', 'kiosk', 'channel', 'overflowing', 'supercalifragilisticexpialidocious']
+    paragraph = "  ".join(" ".join(words[(i * 7 + j) % len(words)] for j in range(i % 5 + 1)) for i in range(12))
+
+    wrapper = TextWrapper(width=width, initial_indent=' ' * indent, subsequent_indent=' ' * indent)
+
+    # TextWrapper leaves trailing whitespace after a long word it broke, wrap_spans never does
+    expected = [line[indent:].rstrip() for line in wrapper.wrap(paragraph)]
+
+    assert [text(line) for line in wrap_spans([(PLAIN, paragraph)], width, indent)] == expected
+
+
+def test_wrap_keeps_styles_across_lines():
+    lines = wrap_spans(parse('plain *bold words that wrap* plain', MEMBERS), 12)
+
+    assert [text(line) for line in lines] == ['plain bold', 'words that', 'wrap plain']
+    assert lines[1] == ((BOLD, 'words that'),)
+    assert lines[2] == ((BOLD, 'wrap'), (PLAIN, ' plain'))
+
+
+def test_wrap_newlines_start_paragraphs():
+    assert [text(line) for line in wrap_spans([(PLAIN, 'one\ntwo\n\nthree')], 20)] == ['one', 'two', 'three']
+
+
+def test_wrap_empty_message_has_a_line():
+    assert wrap_spans([], 20) == [()]
+
+
+def test_wrap_leading_whitespace_before_long_word():
+    # Regression: when whitespace at the start of a paragraph was wider than the line, the long word after it was
+    # placed whole and ran past the border
+    lines = wrap_spans([(PLAIN, ' ' * 8 + 'x' * 12)], 5)
+
+    assert all(span_length(line) <= 5 for line in lines)
+    assert "".join(text(line) for line in lines).strip() == 'x' * 12
+
+
+def test_truncate_spans():
+    line = ((PLAIN, 'abc'), (BOLD, 'defg'))
+
+    assert truncate_spans(line, 5) == ((PLAIN, 'abc'), (BOLD, 'de'))
+    assert truncate_spans(line, 3) == ((PLAIN, 'abc'),)
+    assert truncate_spans(line, 10) == line